@@ -1,26 +1,324 @@
 import decimal
 import json
 import sys
-from datetime import date
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from itertools import islice
 
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils import timezone
 from restless.data import Data
-from restless.preparers import FieldsPreparer
+from restless.constants import ACCEPTED
+from restless.exceptions import BadRequest
 
+from . import labels, printing, receiving
 from .dj4 import DjangoResource
-from .models import Identifier, Location, Supplier, ItemTemplate, Picture
-from .models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale
+from .models import Identifier, LinkedCode, Location, Supplier, ItemTemplate, Picture
+from .models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale, PrintJob
+from .preparers import ReverseFormatter, ValuesPreparer
+from .scans import resolve, resolve_many, scan_cache
+from .search import rank
+from .typeahead import typeahead
+
+LOOKUP_SUFFIXES = {
+    'eq': 'exact',
+    'ge': 'gte',
+    'gt': 'gt',
+    'le': 'lte',
+    'lt': 'lt',
+}
+
+identifier_url = ReverseFormatter('identifier-detail')
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds of times, which ``DjangoJSONEncoder`` cuts to
+    milliseconds: a cursor must compare equal to the row it came from.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
 
 
 class BaseResource(DjangoResource):
+    # keyset pagination; only used when the client asks for a ``limit``
+    cursor_ordering = ('pk',)
+    max_page_size = 500
+    stream_chunk_size = 1000
+    paginated = False
+    next_cursor = None
+    # related records a client may embed with ``?include=``
+    includes = {}
 
     def wrap_list_response(self, data):
 
         d = super(BaseResource, self).wrap_list_response(data)
         d['count'] = len(d['objects'])
+        if self.paginated:
+            d['next'] = self.next_cursor
 
         return d
 
+    def serialize_list(self, data):
+        if isinstance(data, QuerySet):
+            if self.is_streaming():
+                return self.stream_list(data)
+            data = Data(self.prepare_queryset(data), should_prepare=False)
+        return super(BaseResource, self).serialize_list(data)
+
+    def prepare(self, data):
+        prepped = self.included_preparer().prepare(data)
+        names = self.requested_fields()
+        if names and isinstance(prepped, dict) and not hasattr(self.preparer, 'subset'):
+            prepped = {k: v for k, v in prepped.items() if k in names}
+        return prepped
+
+    def requested_fields(self):
+        if self.request is None:
+            return []
+        names = self.request.GET.get('fields', '')
+        return [nm for nm in names.split(',') if nm]
+
+    def sparse_preparer(self):
+        """
+        Narrows the preparer to the ``?fields=`` the client asked for, so list
+        queries select only those columns (and skip unneeded joins).
+        """
+        names = self.requested_fields()
+        if not names or not hasattr(self.preparer, 'subset'):
+            return self.preparer
+        unknown = [nm for nm in names if nm not in self.preparer.fields]
+        if unknown:
+            raise BadRequest("Unknown field(s): {}".format(', '.join(unknown)))
+        return self.preparer.subset(names)
+
+    def included_preparer(self):
+        """
+        Expands the foreign keys named in ``?include=`` into the related
+        records.  They are read by joins in the same query as the list.
+        """
+        preparer = self.sparse_preparer()
+        names = self.request.GET.get('include', '') if self.request else ''
+        names = [nm for nm in names.split(',') if nm]
+        if not names:
+            return preparer
+        unknown = [nm for nm in names if nm not in self.includes]
+        if unknown:
+            raise BadRequest("Cannot include: {}".format(', '.join(unknown)))
+        return preparer.expand({nm: (nm, self.includes[nm]) for nm in names})
+
+    def is_streaming(self):
+        flag = self.request.GET.get('stream', '')
+        return flag.lower() in {'1', 'true', 'yes'}
+
+    def prepare_queryset(self, qs):
+        """
+        Prepares every record of a list queryset, one page at a time if the
+        client asked for one (see ``paginate``).
+
+        When the preparer can be compiled to columns, the rows are read with
+        ``values_list()`` and never become model instances.
+        """
+        return list(self.iter_queryset(qs))
+
+    def iter_queryset(self, qs, chunk_size=None):
+        """
+        Returns an iterator over the prepared records of a list queryset.
+
+        With a ``chunk_size``, an unpaginated listing is read as a series of
+        bounded keyset queries, so no more than one chunk of rows is held at
+        a time (MySQL drivers buffer whole result sets, even for
+        ``iterator()``).  Any ``BadRequest`` is raised here, before the first
+        record is produced.
+        """
+        qs, ordering, limit = self.paginate(qs)
+        chunked = chunk_size and not limit
+        if chunked:
+            ordering = ordering or list(self.cursor_ordering)
+            qs = qs.order_by(*ordering)
+        keys = [nm.lstrip('-') for nm in ordering]
+
+        preparer = self.included_preparer()
+        compiler = getattr(preparer, 'compile', None)
+        plan = compiler(qs.model) if compiler else None
+        if plan:
+            columns, build = plan
+            width = len(columns)
+
+            def select(qs):
+                return qs.values_list(*columns, *keys)
+
+            def row_key(row):
+                return list(row[width:])
+        else:
+            build = self.prepare
+
+            def select(qs):
+                return qs
+
+            def row_key(obj):
+                return [getattr(obj, k) for k in keys]
+
+        if chunked:
+            rows = self.iter_chunks(select(qs), ordering, row_key, chunk_size)
+        else:
+            rows = select(qs)
+
+        def records():
+            last = None
+            for n, row in enumerate(rows, 1):
+                if limit and n > limit:     # the look-ahead record
+                    self.next_cursor = self.encode_cursor(ordering, row_key(last))
+                    break
+                last = row
+                yield build(row)
+        return records()
+
+    def iter_chunks(self, qs, ordering, row_key, size):
+        chunk = list(qs[:size])
+        while chunk:
+            yield from chunk
+            if len(chunk) < size:
+                break
+            after = self.keyset_filter(qs, ordering, row_key(chunk[-1]))
+            chunk = list(qs.filter(after)[:size])
+
+    def stream_list(self, qs):
+        """
+        Serializes a list queryset as a stream of JSON text, one chunk of
+        records at a time.  The body is identical to the unstreamed one.
+        """
+        records = self.iter_queryset(qs, chunk_size=self.stream_chunk_size)
+
+        def body():
+            count = 0
+            yield '{"objects": ['
+            while True:
+                chunk = list(islice(records, self.stream_chunk_size))
+                if not chunk:
+                    break
+                if count:
+                    yield ', '
+                count += len(chunk)
+                yield self.serializer.serialize(chunk)[1:-1]
+            tail = {'count': count}
+            if self.paginated:
+                tail['next'] = self.next_cursor
+            yield '], {}'.format(self.serializer.serialize(tail)[1:])
+        return body()
+
+    def paginate(self, qs):
+        """
+        Applies ``?limit=&after=`` keyset pagination to a queryset.
+
+        Pages are read with an indexed ``WHERE key > last_key`` rather than an
+        ``OFFSET``, so deep pages cost the same as the first one.  Requests
+        without a ``limit`` get the whole result set, as before.
+
+        :returns: ``(queryset, ordering, limit)``; the queryset holds one
+            extra record, so the caller can tell if there is a next page
+        """
+        ordering = self.requested_ordering(qs.model)
+        limit = self.requested_limit()
+        if limit is None:
+            if ordering:
+                qs = qs.order_by(*ordering)
+            return qs, ordering, None
+
+        ordering = ordering or list(self.cursor_ordering)
+        qs = qs.order_by(*ordering)
+        after = self.request.GET.get('after')
+        if after:
+            values = self.decode_cursor(after, ordering)
+            qs = qs.filter(self.keyset_filter(qs, ordering, values))
+
+        self.paginated = True
+        return qs[:limit + 1], ordering, limit
+
+    def requested_limit(self, default=None):
+        """
+        :returns: ``?limit=`` capped at ``max_page_size``, or ``default``
+        """
+        limit = self.request.GET.get('limit')
+        if limit is None:
+            return default
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise BadRequest("'limit' must be a positive number")
+        return min(limit, self.max_page_size)
+
+    def requested_ordering(self, model):
+        """
+        Validates ``?ordering=-updated,price`` against the model's concrete
+        fields.  The primary key is added as a tie-breaker, so the order is
+        total and can be paged through with a cursor.
+
+        :returns: The ``order_by()`` arguments, or an empty ``list``
+        """
+        names = self.request.GET.get('ordering', '')
+        names = [nm for nm in names.split(',') if nm]
+        if not names:
+            return []
+        columns = {'pk': 'pk'}
+        for fld in model._meta.concrete_fields:
+            # order on the key column itself, not the related model's ordering
+            columns[fld.name] = fld.attname
+        ordering = []
+        for nm in names:
+            desc = nm.startswith('-')
+            fld = nm.lstrip('-')
+            if fld not in columns:
+                raise BadRequest("Cannot order by '{}'".format(fld))
+            ordering.append('{}{}'.format('-' if desc else '', columns[fld]))
+        if not {'pk', model._meta.pk.attname} & {nm.lstrip('-') for nm in ordering}:
+            ordering.append('pk')
+        return ordering
+
+    def keyset_filter(self, qs, ordering, values):
+        # (a > x) OR (a = x AND b > y) OR ... -- '-' orders compare with '<'
+        # NULLs sort where the database puts them: lowest on MySQL/SQLite
+        nulls_high = connections[qs.db].features.nulls_order_largest
+        q = Q(pk__in=[])
+        ties = Q()
+        for nm, val in zip(ordering, values):
+            fld = nm.lstrip('-')
+            desc = nm.startswith('-')
+            nulls_last = nulls_high != desc
+            isnull = '{}__isnull'.format(fld)
+            if val is None:
+                after = Q(pk__in=[]) if nulls_last else Q(**{isnull: False})
+                tie = Q(**{isnull: True})
+            else:
+                after = Q(**{'{}__{}'.format(fld, 'lt' if desc else 'gt'): val})
+                if nulls_last:
+                    after |= Q(**{isnull: True})
+                tie = Q(**{fld: val})
+            q |= ties & after
+            ties &= tie
+        return q
+
+    def encode_cursor(self, ordering, values):
+        raw = json.dumps([ordering, values], cls=CursorEncoder)
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor, ordering):
+        try:
+            raw = urlsafe_b64decode(cursor.encode())
+            [order, values] = json.loads(raw)
+        except (TypeError, ValueError):
+            raise BadRequest("'after' is not a valid cursor")
+        if order != ordering or len(values) != len(ordering):
+            raise BadRequest("'after' cursor does not match this listing")
+        return values
+
     def deserialize_list(self, body):
         """
         Given a string of text, deserializes a (presumed) list out of the body.
@@ -54,71 +352,192 @@ class BaseResource(DjangoResource):
             params[nm] = (typ, val)
         return params
 
-    def filter_record(self, params, record):
-        keep = True
+    def filter_queryset(self, qs):
+        params = self.check_search_criteria(qs.model._meta.fields)
+        if not params:
+            # no filters; just return everything
+            return qs
+        lookups = self.build_lookups(params)
+        if lookups is None:     # a comparison that can never match
+            return qs.none()
+        return qs.filter(**lookups)
+
+    def build_lookups(self, params):
+        """
+        Translates search criteria into ORM lookups, so the database does
+        the filtering.
+
+        :returns: The ``filter()`` arguments, or ``None`` for a comparison
+            that can never match
+        """
+        lookups = {}
         for k, v in params.items():
             typ = v[0]
             val = v[1]
-            fld = getattr(record, k, None)
-            # TODO:  replace with 'match-case' construct
             if typ == 'CharField' or typ == 'TextField':
-                if not val.lower() in fld.lower():
-                    keep = False
+                lookups['{}__icontains'.format(k)] = val
             elif typ == 'ForeignKey' or typ == 'OneToOneField':
-                key = getattr(record, '{}_id'.format(k), None)
                 if val == 'None':   # looking for unlinked records
-                    keep = True if fld is None else False
+                    lookups['{}__isnull'.format(k)] = True
                 else:   # looking for a specific link
-                    keep = True if (val == key or int(val) == key) else False
+                    lookups[k] = val
             else:
                 d2 = None
                 [cmp, info] = val.split(':')
                 d1 = info
                 if cmp == 'bt':
                     [d1, d2] = info.split(',')
-                if typ == 'DateField':
+                if typ == 'DateTimeField':
+                    # compare on the local calendar date of the timestamp
                     limit = date.fromisoformat(d2) if d2 else None
                     when = date.fromisoformat(d1)
-                    keep = self.compare_values(cmp, fld, when, limit)
-                elif typ == 'DecimalField':
-                    limit = Decimal(d2) if d2 else None
-                    amount = Decimal(d1)
-                    keep = self.compare_values(cmp, fld, amount, limit)
-                else:   # default to numeric values
-                    limit = int(d2) if d2 else None
-                    number = int(d1)
-                    keep = self.compare_values(cmp, fld, number, limit)
-            # end of 'match-case' construct
-            if not keep:
-                break
-        return keep
-
-    def compare_values(self, typ, val0, val1, val2=None):
-        rv = False
-
-        if typ == 'bt':     # between
-            rv = val0 > val1 and val0 < val2
-        elif typ == 'eq':   # equal
-            rv = val0 == val1
-        elif typ == 'ge':   # greater or equal
-            rv = val0 >= val1
-        elif typ == 'gt':   # greater than
-            rv = val0 > val1
-        elif typ == 'le':   # less or equal
-            rv = val0 <= val1
-        elif typ == 'lt':   # less than
-            rv = val0 < val1
-        #
-        return rv
+                    terms = self.compare_dates(cmp, k, when, limit)
+                else:
+                    if typ == 'DateField':
+                        limit = date.fromisoformat(d2) if d2 else None
+                        when = date.fromisoformat(d1)
+                    elif typ == 'DecimalField':
+                        limit = Decimal(d2) if d2 else None
+                        when = Decimal(d1)
+                    else:   # default to numeric values
+                        limit = int(d2) if d2 else None
+                        when = int(d1)
+                    terms = self.compare_lookups(cmp, k, when, limit)
+                if terms is None:
+                    return None
+                lookups.update(terms)
+        return lookups
+
+    def compare_lookups(self, typ, name, val1, val2=None):
+        if typ == 'bt':     # between (exclusive)
+            return {'{}__gt'.format(name): val1, '{}__lt'.format(name): val2}
+        if typ in LOOKUP_SUFFIXES:
+            return {'{}__{}'.format(name, LOOKUP_SUFFIXES[typ]): val1}
+        return None
+
+    def compare_dates(self, typ, name, val1, val2=None):
+        # bound the timestamp by local midnights, so an index can be used
+        def midnight(day):
+            return timezone.make_aware(datetime.combine(day, time.min))
+
+        one = timedelta(days=1)
+        if typ == 'bt':
+            return {'{}__gte'.format(name): midnight(val1 + one),
+                    '{}__lt'.format(name): midnight(val2)}
+        if typ == 'eq':
+            return {'{}__gte'.format(name): midnight(val1),
+                    '{}__lt'.format(name): midnight(val1 + one)}
+        if typ == 'ge':
+            return {'{}__gte'.format(name): midnight(val1)}
+        if typ == 'gt':
+            return {'{}__gte'.format(name): midnight(val1 + one)}
+        if typ == 'le':
+            return {'{}__lt'.format(name): midnight(val1 + one)}
+        if typ == 'lt':
+            return {'{}__lt'.format(name): midnight(val1)}
+        return None
+
+    def queue_label(self, barcode):
+        """
+        Hands a label to the print spooler; an optional ``format`` and
+        ``template`` may come in the request body.
+        """
+        data = self.data if isinstance(self.data, dict) else {}
+        fmt = data.get('format') or None
+        template = data.get('template') or ''
+        errs = {}
+        if fmt is not None and fmt not in labels.FORMATS:
+            errs['format'] = 'One of: {}'.format(', '.join(sorted(labels.FORMATS)))
+        if template and template not in labels.TEMPLATES:
+            errs['template'] = 'One of: {}'.format(', '.join(sorted(labels.TEMPLATES)))
+        if errs:
+            return Data({'errors': errs}, should_prepare=False)
+
+        job = printing.enqueue(barcode, fmt, template)
+        return Data(PrintJobResource.preparer.prepare(job), should_prepare=False)
 
 
 class IdentResource(BaseResource):
+    max_results = 25
+    max_scans = 2000    # most digit strings one POST may resolve
+    TYPES = [Identifier.Kind.LOC, Identifier.Kind.ITEM, Identifier.Kind.OTHER]
+
+    def __init__(self, *args, **kwargs):
+        super(IdentResource, self).__init__(*args, **kwargs)
+
+        # copy first: the default mapping is shared by every resource
+        self.http_methods = {k: dict(v) for k, v in self.http_methods.items()}
+        self.http_methods['list'].update({
+                'POST': 'scan_batch',
+        })
+        return
 
     def is_authenticated(self):
         if self.request.method == 'GET':
             return True
-        else:
-            return False
+        if self.request.method == 'POST' and self.endpoint == 'list':
+            return True     # a batch of lookups; changes nothing
+        return False
+
+    @staticmethod
+    def prefix_range(field, prefix):
+        # digits sort before ':', so [prefix, successor) is an index range scan
+        successor = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return {field + '__gte': prefix, field + '__lt': successor}
+
+    # GET /api/idents?prefix=<digitstring>
+    def list(self):
+        """
+        Candidates whose barcode or linked code starts with ``?prefix=``,
+        for labels that can only be partly read.  They are grouped LOC, ITM,
+        then OTHER, at most ``?limit=`` of them.
+        """
+        prefix = self.request.GET.get('prefix', '')
+        if not prefix.isdigit():
+            raise BadRequest("'prefix' must be a string of digits")
+        limit = self.requested_limit(self.max_results)
+
+        found = {}
+        by_barcode = (Identifier.idents.filter(**self.prefix_range('barcode', prefix))
+                      .order_by('barcode').values_list('barcode', 'linked_code', 'kind'))
+        by_code = (LinkedCode.objects.filter(**self.prefix_range('code', prefix))
+                   .order_by('code').values_list('identifier_id', 'code', 'identifier__kind'))
+        for qs in [by_barcode, by_code]:
+            for barcode, linked_code, kind in qs[:limit]:
+                found.setdefault(barcode, (linked_code, kind))
+
+        objects = [{'identifier': bc, 'linked_code': lc, 'type': kind}
+                   for bc, (lc, kind) in found.items()]
+        objects.sort(key=lambda d: (self.TYPES.index(d['type']), d['identifier']))
+        return Data(objects[:limit], should_prepare=False)
+
+    # POST /api/idents    ["1007", "0006151620418", ...]
+    def scan_batch(self):
+        """
+        Resolves a batch of scans (e.g. a handheld scanner's upload) at once;
+        the results come back in input order, shaped like ``detail``.
+        """
+        digitstrings = self.data
+        if not isinstance(digitstrings, list) or not all(isinstance(ds, str)
+                                                         for ds in digitstrings):
+            errs = {'digitstrings': 'Expected a list of digit strings'}
+            return Data({'errors': errs}, should_prepare=False)
+        if len(digitstrings) > self.max_scans:
+            errs = {'digitstrings': 'At most {} at a time'.format(self.max_scans)}
+            return Data({'errors': errs}, should_prepare=False)
+
+        scans = resolve_many([ds for ds in digitstrings if ds.isdigit()])
+        objects = []
+        for ds in digitstrings:
+            data = {'digitstring': ds}
+            if ds.isdigit():
+                scan = scans[ds]
+                data['identifier'] = scan.barcode if scan else ""
+                data['type'] = scan.kind if scan else Identifier.Kind.OTHER
+            else:
+                data['errors'] = {'digitstring': 'Must be a string of digits'}
+            objects.append(data)
+        return Data({'objects': objects, 'count': len(objects)}, should_prepare=False)
 
     # GET /api/idents/<digitstring>
     def detail(self, digitstring):
@@ -128,28 +547,17 @@ class IdentResource(BaseResource):
             errs = {'digitstring': 'Must be a string of digits'}
             return Data({'errors': errs}, should_prepare=False)
 
-        try:
-            id = Identifier.idents.get(barcode=digitstring)
-        except Identifier.DoesNotExist:
-            try:
-                id = Identifier.idents.get(linked_code=digitstring)
-            except Identifier.DoesNotExist:
-                id = None
-
-        ident = id.barcode if id else ""
-        data['identifier'] = ident
-        data['type'] = 'OTHER'
-        if len(ident) == Identifier.LOC_LEN:
-            data['type'] = 'LOC'
-        if len(ident) == Identifier.ITM_LEN:
-            data['type'] = 'ITM'
+        scan = resolve(digitstring)
+        data['identifier'] = scan.barcode if scan else ""
+        data['type'] = scan.kind if scan else Identifier.Kind.OTHER
         return data
 
 
 class LocIdResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'barcode': 'barcode',
     })
+    max_count = 10000   # most IDs one POST may create
 
     def is_authenticated(self):
         if self.request.method == 'GET':
@@ -168,21 +576,75 @@ class LocIdResource(BaseResource):
         qs = Identifier.locIDs.get(barcode=pk)
         return qs
 
-    # POST /api/locid/
+    # POST /api/locid/    {"count": 250} for a batch
     def create(self):
-        bc = Identifier.make_loc_id()
-        id = Identifier.locIDs.create(barcode=bc)
-        return id
+        try:
+            if 'count' not in self.data:
+                bc = Identifier.make_loc_id()
+                id = Identifier.locIDs.create(barcode=bc)
+                return id
+
+            count, errs = self.requested_count()
+            if not errs:
+                return self.created_batch(Identifier.make_loc_ids(count))
+        except ValueError as e:     # the ID numbers are running out
+            errs = {'count': '{}'.format(e)}
+        return Data({'errors': errs}, should_prepare=False)
+
+    def requested_count(self):
+        count = self.data['count']
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            return None, {'count': 'Must be a positive number'}
+        if count > self.max_count:
+            return None, {'count': 'At most {} at a time'.format(self.max_count)}
+        return count, {}
+
+    def created_batch(self, barcodes):
+        scan_cache.clear()  # bulk_create sends no post_save
+        objects = [{'barcode': bc} for bc in barcodes]
+        return Data({'objects': objects, 'count': len(objects)}, should_prepare=False)
+
+
+class ItemIdResource(LocIdResource):
+
+    # GET /api/itemid/
+    def list(self):
+        qs = Identifier.itemIDs.all()
+        return qs
+
+    # GET /api/itemid/<pk>/
+    def detail(self, pk):
+        qs = Identifier.itemIDs.get(barcode=pk)
+        return qs
+
+    # POST /api/itemid/    {"count": 250} for a batch
+    def create(self):
+        try:
+            if 'count' not in self.data:
+                bc = Identifier.make_item_id()
+                id = Identifier.itemIDs.create(barcode=bc)
+                return id
+
+            count, errs = self.requested_count()
+            if not errs:
+                return self.created_batch(Identifier.make_item_ids(count))
+        except ValueError as e:     # the ID numbers are running out
+            errs = {'count': '{}'.format(e)}
+        return Data({'errors': errs}, should_prepare=False)
 
 
 class LocationResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'name': 'name',
         'description': 'description',
         'locID': 'identifier.urlize',
         'barcode': 'identifier_id'
+    }, computed={
+        'identifier.urlize': ('identifier_id', identifier_url),
     })
 
+    status_map = dict(BaseResource.status_map, print_label=ACCEPTED)
+
     def __init__(self, *args, **kwargs):
         super(LocationResource, self).__init__(*args, **kwargs)
 
@@ -202,16 +664,7 @@ class LocationResource(BaseResource):
     def list(self):
         qs = Location.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Location._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # GET /api/location/<pk>/
     def detail(self, pk):
@@ -263,15 +716,50 @@ class LocationResource(BaseResource):
         loc.save()
         return loc
 
+    # PATCH /api/location/<pk>/    queues a label for the spooler
     def print_label(self, pk):
 
         loc = Location.objects.get(identifier_id=pk)
-        print('Printing barcode label for Location "{}"'.format(loc))
-        return
+        return self.queue_label(loc.identifier_id)
+
+
+class PrintJobResource(BaseResource):
+    preparer = ValuesPreparer(fields={
+        'id': 'id',
+        'barcode': 'identifier_id',
+        'format': 'format',
+        'template': 'template',
+        'status': 'status',
+        'requests': 'requests',
+        'output': 'output',
+        'error': 'error',
+        'created': 'created',
+        'updated': 'updated'
+    })
+
+    def is_authenticated(self):
+        return self.request.method == 'GET'
+
+    # GET /api/printjob/
+    def list(self):
+        qs = PrintJob.objects.all()
+        # check for search parameters
+        return self.filter_queryset(qs)
+
+    # GET /api/printjob/<pk>/
+    def detail(self, pk):
+
+        try:
+            job = PrintJob.objects.get(id=pk)
+        except PrintJob.DoesNotExist:
+            errs = {'id': 'Print job #{} not found'.format(pk)}
+            return Data({'errors': errs}, should_prepare=False)
+
+        return job
 
 
 class SupplierResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'name': 'name',
         'street': 'street',
@@ -295,16 +783,7 @@ class SupplierResource(BaseResource):
     def list(self):
         qs = Supplier.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Supplier._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # GET /api/supplier/<pk>/
     def detail(self, pk):
@@ -356,7 +835,7 @@ class SupplierResource(BaseResource):
 
 
 class ItemTemplateResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'description': 'description',
         'brand': 'brand',
         'content': 'content',
@@ -366,8 +845,12 @@ class ItemTemplateResource(BaseResource):
         'itmID': 'identifier.urlize',
         'barcode': 'identifier_id',
         'linked_code': 'identifier.linked_code'
+    }, computed={
+        'identifier.urlize': ('identifier_id', identifier_url),
     })
 
+    status_map = dict(BaseResource.status_map, print_label=ACCEPTED)
+
     def __init__(self, *args, **kwargs):
         super(ItemTemplateResource, self).__init__(*args, **kwargs)
 
@@ -387,16 +870,7 @@ class ItemTemplateResource(BaseResource):
     def list(self):
         qs = ItemTemplate.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(ItemTemplate._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # GET /api/item/<pk>/
     def detail(self, pk):
@@ -431,8 +905,7 @@ class ItemTemplateResource(BaseResource):
         bc = Identifier.make_item_id()
         id = Identifier.itemIDs.create(barcode=bc)
         if upc:
-            setattr(id, 'linked_code', upc)
-            id.save()
+            LinkedCode.link(id, upc)
         setattr(item, 'identifier', id)
 
         item.save()
@@ -445,8 +918,7 @@ class ItemTemplateResource(BaseResource):
         if upc:
             bc = Identifier.itemIDs.get(barcode=pk)
             if not bc.linked_code == upc:
-                setattr(bc, 'linked_code', upc)
-                bc.save()
+                LinkedCode.link(bc, upc)
 
         item = ItemTemplate.objects.get(identifier_id=pk)
         desc = self.data['description'] if 'description' in self.data else item.description
@@ -473,11 +945,68 @@ class ItemTemplateResource(BaseResource):
             item.save()
         return item
 
+    # PATCH /api/item/<pk>/    queues a label for the spooler
     def print_label(self, pk):
 
         item = ItemTemplate.objects.get(identifier_id=pk)
-        print('Printing barcode label for Item "{}"'.format(item))
-        return
+        return self.queue_label(item.identifier_id)
+
+
+class ItemSearchResource(BaseResource):
+    preparer = ItemTemplateResource.preparer
+    max_results = 50
+
+    def is_authenticated(self):
+        return self.request.method == 'GET'
+
+    # GET /api/item/search?q=moda+blue+batik
+    def list(self):
+        """
+        Ranked search of the catalog through the term index; each record
+        carries its ``score``.  ``?limit=`` caps the number of results.
+        """
+        ranked = rank(self.request.GET.get('q', ''),
+                      self.requested_limit(self.max_results))
+        if not ranked:
+            return Data([], should_prepare=False)
+        preparer = self.included_preparer()
+        qs = ItemTemplate.objects.filter(pk__in=[pk for pk, score in ranked])
+        plan = preparer.compile(ItemTemplate)
+        if plan is None:
+            found = {obj.pk: preparer.prepare(obj) for obj in qs}
+        else:
+            columns, build = plan
+            found = {row[0]: build(row[1:]) for row in qs.values_list('pk', *columns)}
+
+        results = []
+        for pk, score in ranked:
+            d = found[pk]
+            d['score'] = score
+            results.append(d)
+        return Data(results, should_prepare=False)
+
+
+class ItemSuggestResource(BaseResource):
+    max_results = 10
+
+    def is_authenticated(self):
+        return self.request.method == 'GET'
+
+    # GET /api/item/suggest?q=mod
+    def list(self):
+        """
+        As-you-type suggestions: brands, then item descriptions, starting
+        with ``?q=``.  Served from memory; see ``inventory.typeahead``.
+        """
+        limit = self.requested_limit(self.max_results)
+        found = typeahead.suggest(self.request.GET.get('q', ''), limit)
+        results = []
+        for field, text, pk in found:
+            d = {'field': field, 'value': text}
+            if pk is not None:
+                d['barcode'] = pk
+            results.append(d)
+        return Data(results, should_prepare=False)
 
 
 class ItemDataResource(BaseResource):
@@ -497,21 +1026,14 @@ class ItemDataResource(BaseResource):
             errs = {'digitstring': 'Must be a string of digits'}
             return Data({'errors': errs}, should_prepare=False)
 
-        try:
-            ident = Identifier.idents.get(barcode=digitstring)
-        except Identifier.DoesNotExist:
-            try:
-                ident = Identifier.idents.get(linked_code=digitstring)
-            except Identifier.DoesNotExist:
-                ident = None
-
-        if ident:
-            data['barcode'] = ident.barcode
-            data['linked_code'] = ident.linked_code
-            data['itmID'] = ident.urlize()
-            item = ItemTemplate.objects.get(identifier_id=ident.barcode)
-            for fld in ['description', 'brand', 'content', 'part_unit', 'yardage', 'notes']:
-                val = getattr(item, fld, None)
+        scan = resolve(digitstring)
+        if scan:
+            if scan.item is None:
+                raise ItemTemplate.DoesNotExist("No item for {}".format(scan.barcode))
+            data['barcode'] = scan.barcode
+            data['linked_code'] = scan.linked_code
+            data['itmID'] = identifier_url(scan.barcode)
+            for fld, val in scan.item.items():
                 if val:
                     data[fld] = val
 
@@ -535,17 +1057,15 @@ class ItemDataResource(BaseResource):
         # update StockBook record
         if 'units' in self.data:
             units = self.data['units'] if 'units' in self.data else None
-            stockRcd, created = StockBook.objects.get_or_create(itm=item)
-            if units and stockRcd.units != float(units):
-                setattr(stockRcd, 'units', units)
-                created = True
-            if created:
-                stockRcd.save()
-                updates['StockBook'] = created
-
-        # update Purchase record
-        if 'cost' in self.data:
-            money = Decimal(self.data['cost'])
+            if receiving.set_units(item, Decimal('{}'.format(units)) if units else None):
+                updates['StockBook'] = True
+
+        # update Purchase record; 'received' is the quantity that came in,
+        # apart from the stock on hand in 'units'
+        if 'cost' in self.data or 'received' in self.data:
+            money = Decimal(self.data['cost'] if self.data.get('cost') else 0)
+            received = self.data['received'] if 'received' in self.data else None
+            received = Decimal('{}'.format(received)) if received else None
             inv_id = self.data['invoice'] if 'invoice' in self.data else None
             if not inv_id:
                 errs = {'invoice': 'No invoice ID'}
@@ -556,12 +1076,8 @@ class ItemDataResource(BaseResource):
                 errs = {'invoice': 'Invoice not found'}
                 return Data({'errors': errs}, should_prepare=False)
 
-            purchase, created = Purchase.objects.get_or_create(invoice=invoice, item=item)
-            if not created:
-                money += purchase.cost
-            setattr(purchase, 'cost', money)
-            purchase.save()
-            updates['purchase'] = purchase.id
+            # added in the database: concurrent scans of an item cannot lose one
+            updates['purchase'] = receiving.add_cost(invoice, item, money, received)
 
         # update Price record
         if 'price' in self.data:
@@ -578,8 +1094,80 @@ class ItemDataResource(BaseResource):
         return updates
 
 
+class ItemDetailsResource(BaseResource):
+    """
+    Everything the receiving desk shows for an item: its stock, price and
+    most recent purchase, read in two indexed queries.
+    """
+
+    def is_authenticated(self):
+        return self.request.method == 'GET'
+
+    # GET /api/itemdetails/<pk>
+    def detail(self, pk):
+
+        found = list(ItemTemplate.objects.filter(identifier_id=pk).values_list(
+                     'yardage', 'stockbook__units', 'stockbook__loc_id', 'price__price'))
+        if not found:
+            errs = {'item': 'Item not found'}
+            return Data({'errors': errs}, should_prepare=False)
+        yardage, units, loc, price = found[0]
+
+        data = {
+            'item': '{}'.format(pk),
+            'itm_type': ItemTemplate.yardage_type(yardage),
+            'units': units,
+            'loc': loc,
+            'price': price,
+            'cost': None,
+            'purchase': None,
+        }
+        latest = (Purchase.objects.filter(item_id=pk).order_by('-invoice__received', '-id')
+                  .values_list('id', 'cost', 'invoice_id', 'invoice__vendor_id',
+                               'invoice__received')[:1])
+        for pchs_id, cost, inv_id, vendor, received in latest:
+            data['cost'] = cost
+            data['purchase'] = {
+                'id': pchs_id,
+                'invoice': inv_id,
+                'vendor': vendor,
+                'received': received,
+            }
+        return Data(data, should_prepare=False)
+
+
+class ReceivingResource(BaseResource):
+    max_lines = 2000    # most lines one POST may receive
+
+    def is_authenticated(self):
+        user = self.request.user
+        ok = user.has_perm('inventory.add_purchase')
+        return ok
+
+    # POST /api/receiving    {"invoice": 101, "lines": [{"item": "1000002", "units": 5,
+    #                                                    "cost": "9.10", "price": "12.50"}]}
+    def create(self):
+
+        errs = {}
+        inv_id = self.data.get('invoice') if isinstance(self.data, dict) else None
+        if not inv_id:
+            errs['invoice'] = 'No invoice ID'
+        lines = self.data.get('lines') if isinstance(self.data, dict) else None
+        if not isinstance(lines, list) or not lines:
+            errs['lines'] = 'A list of lines is required'
+        elif len(lines) > self.max_lines:
+            errs['lines'] = 'At most {} lines at a time'.format(self.max_lines)
+        if errs:
+            return Data({'errors': errs}, should_prepare=False)
+
+        summary, errs = receiving.receive(inv_id, lines)
+        if errs:
+            return Data({'errors': errs}, should_prepare=False)
+        return Data(summary, should_prepare=False)
+
+
 class PictureResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'photo': 'photo.name',
         'uploaded': 'uploaded',
@@ -597,16 +1185,7 @@ class PictureResource(BaseResource):
     def list(self):
         qs = Picture.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Picture._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # GET /api/picture/<pk>/
     def detail(self, pk):
@@ -649,14 +1228,20 @@ class PictureResource(BaseResource):
 
 
 class StockBookResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'itm': 'itm_id',
         'itm_type': 'itm.type_item',
         'loc': 'loc_id',
         'units': 'units',
         'created': 'created',
         'updated': 'updated',
+    }, computed={
+        'itm.type_item': ('itm__yardage', ItemTemplate.yardage_type),
     })
+    includes = {
+        'itm': ItemTemplateResource.preparer,
+        'loc': LocationResource.preparer,
+    }
 
     def is_authenticated(self):
         if self.request.method == 'GET':
@@ -669,16 +1254,7 @@ class StockBookResource(BaseResource):
     def list(self):
         qs = StockBook.objects.select_related("itm").all()
         # check for search parameters
-        params = self.check_search_criteria(StockBook._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # GET /api/stockbook/<pk>/
     def detail(self, pk):
@@ -768,12 +1344,15 @@ class StockBookResource(BaseResource):
 
 
 class PriceResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'itm': 'itm_id',
         'price': 'price',
         'created': 'created',
         'updated': 'updated',
     })
+    includes = {
+        'itm': ItemTemplateResource.preparer,
+    }
 
     def is_authenticated(self):
 
@@ -804,16 +1383,7 @@ class PriceResource(BaseResource):
     def list(self):
         qs = Price.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Price._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # POST /api/price/
     def create(self):
@@ -870,10 +1440,13 @@ class PriceResource(BaseResource):
 
 
 class InvoiceResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'vendor': 'vendor_id',
-        'received': 'received'
+        'received': 'received',
+        'lines': 'lines',
+        'total_cost': 'total_cost',
+        'total_units': 'total_units'
     })
 
     def is_authenticated(self):
@@ -898,16 +1471,7 @@ class InvoiceResource(BaseResource):
     def list(self):
         qs = Invoice.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Invoice._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # POST /api/invoice/
     def create(self):
@@ -935,12 +1499,17 @@ class InvoiceResource(BaseResource):
 
 
 class PurchaseResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'invoice': 'invoice_id',
         'item': 'item_id',
-        'cost': 'cost'
+        'cost': 'cost',
+        'units': 'units'
     })
+    includes = {
+        'invoice': InvoiceResource.preparer,
+        'item': ItemTemplateResource.preparer,
+    }
 
     def is_authenticated(self):
 
@@ -965,16 +1534,7 @@ class PurchaseResource(BaseResource):
     def list(self):
         qs = Purchase.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Purchase._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # POST /api/purchase/
     def create(self):
@@ -1041,7 +1601,7 @@ class PurchaseResource(BaseResource):
 
 
 class ReceiptResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'status': 'status',
         'count': 'count',
@@ -1073,16 +1633,7 @@ class ReceiptResource(BaseResource):
     def list(self):
         qs = Receipt.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(Receipt._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # POST /api/receipt/
     def create(self):
@@ -1119,7 +1670,7 @@ class ReceiptResource(BaseResource):
 
 
 class ItemSaleResource(BaseResource):
-    preparer = FieldsPreparer(fields={
+    preparer = ValuesPreparer(fields={
         'id': 'id',
         'receipt': 'receipt_id',
         'item': 'item_id',
@@ -1128,6 +1679,10 @@ class ItemSaleResource(BaseResource):
         'adjusted': 'adjusted',
         'created': 'created'
     })
+    includes = {
+        'receipt': ReceiptResource.preparer,
+        'item': ItemTemplateResource.preparer,
+    }
 
     def is_authenticated(self):
         if self.request.method == 'GET':
@@ -1151,16 +1706,7 @@ class ItemSaleResource(BaseResource):
     def list(self):
         qs = ItemSale.objects.all()
         # check for search parameters
-        params = self.check_search_criteria(ItemSale._meta.fields)
-        if params:
-            rcds = []
-            for rcd in qs.iterator():
-                keep = self.filter_record(params, rcd)
-                if keep:
-                    rcds.append(rcd)
-            return rcds
-        # no filters; just return everything
-        return qs
+        return self.filter_queryset(qs)
 
     # POST /api/itemsale/
     def create(self):
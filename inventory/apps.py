@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # connect the signals that keep the search indexes, caches and
+        # invoice totals current
+        from . import scans, search, summaries, typeahead  # noqa: F401
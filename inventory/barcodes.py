@@ -0,0 +1,132 @@
+"""
+Barcode symbologies, encoded as module widths.
+
+An encoding is a ``tuple`` of run widths, in modules, alternating bar and
+space and starting with a bar -- e.g. ``(2, 1, 1, 2, ...)``.  Renderers
+only need to draw the bars at the running offsets.
+"""
+from functools import lru_cache
+
+# Code 128 symbol values 0..106 (103-105 are the start codes, 106 the stop),
+# as the widths of bar, space, bar, space, bar, space(, bar)
+CODE128_PATTERNS = [
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312',
+    '132212', '221213', '221312', '231212', '112232', '122132', '122231', '113222',
+    '123122', '123221', '223211', '221132', '221231', '213212', '223112', '312131',
+    '311222', '321122', '321221', '312212', '322112', '322211', '212123', '212321',
+    '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121',
+    '313121', '211331', '231131', '213113', '213311', '213131', '311123', '311321',
+    '331121', '312113', '312311', '332111', '314111', '221411', '431111', '111224',
+    '111422', '121124', '121421', '141122', '141221', '112214', '112412', '122114',
+    '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112',
+    '421211', '212141', '214121', '412121', '111143', '111341', '131141', '114113',
+    '114311', '411113', '411311', '113141', '114131', '311141', '411131', '211412',
+    '211214', '211232', '2331112',
+]
+START_B, START_C, CODE_B, STOP = 104, 105, 100, 106
+
+# EAN-13: the left-hand odd (L) digit patterns; R is L inverted, G is R reversed
+EAN_L = ['0001101', '0011001', '0010011', '0111101', '0100011',
+         '0110001', '0101111', '0111011', '0110111', '0001011']
+EAN_R = [p.translate(str.maketrans('01', '10')) for p in EAN_L]
+EAN_G = [p[::-1] for p in EAN_R]
+# the first digit is carried by the L/G parity of the next six
+EAN_PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG',
+              'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL']
+
+
+def code128_values(data):
+    """
+    Symbol values for ``data``: code set C (two digits a symbol) for digit
+    strings, finishing an odd one in code set B; code set B otherwise.
+    """
+    if not data:
+        raise ValueError("Nothing to encode")
+    if any(not (32 <= ord(ch) < 127) for ch in data):
+        raise ValueError("Code 128 B encodes printable ASCII only")
+    if data.isdigit() and len(data) >= 2:
+        pairs = len(data) // 2 * 2
+        values = [START_C] + [int(data[ix:ix + 2]) for ix in range(0, pairs, 2)]
+        if pairs < len(data):
+            values += [CODE_B, ord(data[-1]) - 32]
+    else:
+        values = [START_B] + [ord(ch) - 32 for ch in data]
+    checksum = (values[0] + sum(ix * val for ix, val in enumerate(values[1:], 1))) % 103
+    return values + [checksum, STOP]
+
+
+def code128(data):
+    return tuple(int(w) for val in code128_values(data) for w in CODE128_PATTERNS[val])
+
+
+def ean_check_digit(digits):
+    """The EAN/UPC check digit for 12 (or 7, for EAN-8) digits."""
+    total = sum(int(d) * (3 if ix % 2 else 1) for ix, d in enumerate(reversed(digits), 1))
+    return (10 - total % 10) % 10
+
+
+def ean13_digits(digits):
+    """
+    :param digits: an EAN-13, or a 12-digit UPC-A, with its check digit
+    :returns: The 13 digits; a UPC-A is an EAN-13 with a leading zero
+    :raises ValueError: for anything else, or a bad check digit
+    """
+    if not digits.isdigit() or len(digits) not in (12, 13):
+        raise ValueError("EAN-13 needs 13 digits, or a UPC-A 12")
+    digits = digits.zfill(13)
+    if int(digits[-1]) != ean_check_digit(digits[:-1]):
+        raise ValueError("Bad EAN-13 check digit")
+    return digits
+
+
+def ean13(digits):
+    """:param digits: an EAN-13, or a UPC-A, with its check digit"""
+    digits = ean13_digits(digits)
+
+    parity = EAN_PARITY[int(digits[0])]
+    modules = '101'
+    for d, side in zip(digits[1:7], parity):
+        modules += (EAN_L if side == 'L' else EAN_G)[int(d)]
+    modules += '01010'
+    modules += ''.join(EAN_R[int(d)] for d in digits[7:])
+    modules += '101'
+    return runs(modules)
+
+
+def runs(modules):
+    """Turns a '1'/'0' module string, starting with a bar, into run widths."""
+    widths = []
+    last = None
+    for m in modules:
+        if m == last:
+            widths[-1] += 1
+        else:
+            widths.append(1)
+            last = m
+    return tuple(widths)
+
+
+SYMBOLOGIES = {
+    'code128': code128,
+    'ean13': ean13,
+}
+
+
+@lru_cache(maxsize=4096)
+def encode(data, symbology='code128'):
+    return SYMBOLOGIES[symbology](data)
+
+
+def bars(widths):
+    """
+    :returns: ``(offset, width)`` of each bar, in modules
+    """
+    found = []
+    x = 0
+    for ix, w in enumerate(widths):
+        if ix % 2 == 0:
+            found.append((x, w))
+        x += w
+    return found
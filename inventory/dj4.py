@@ -3,7 +3,7 @@ import six
 from django.conf import settings
 from django.urls import re_path
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
 from restless.constants import OK, NO_CONTENT
@@ -36,7 +36,11 @@ class DjangoResource(Resource):
             content_type = 'text/plain'
         else:
             content_type = 'application/json'
-        resp = HttpResponse(data, content_type=content_type, status=status)
+        if isinstance(data, (str, bytes)):
+            resp = HttpResponse(data, content_type=content_type, status=status)
+        else:   # an iterator of serialized chunks
+            resp = StreamingHttpResponse(data, content_type=content_type,
+                                         status=status)
         return resp
 
     def build_error(self, err):
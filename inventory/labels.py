@@ -0,0 +1,344 @@
+"""
+Label rendering: barcodes with an item's description, price and location,
+drawn to SVG, PDF or ZPL, one label at a time or laid out on sheets.
+
+A template turns one label's data into drawing operations, in points with
+the origin at the label's top left; each output format draws those.
+Barcodes are the costly part, so each rendered barcode is cached by
+``(code, template, format)``.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from .barcodes import bars, ean13_digits, encode
+from .models import Identifier, ItemTemplate, Location
+
+CACHE_SIZE = 2048   # rendered barcodes kept for reprints
+ZPL_DPI = 203
+
+Label = namedtuple('Label', ['barcode', 'kind', 'title', 'price', 'location', 'linked_code'])
+
+# a page of ``cols`` x ``rows`` labels; sizes in points
+Sheet = namedtuple('Sheet', ['width', 'height', 'cols', 'rows',
+                             'left', 'top', 'col_pitch', 'row_pitch'])
+
+SHEETS = {
+    'letter-30': Sheet(612, 792, 3, 10, 13.5, 36, 198, 72),     # Avery 5160 and the like
+    'letter-10': Sheet(612, 792, 2, 5, 11.25, 36, 301.5, 144),  # 4" x 2" shipping labels
+}
+
+
+class LabelTemplate(object):
+    """
+    The layout of one kind of label.  ``symbology`` is ``code128`` for our
+    own barcodes, or ``ean13`` to print an item's linked EAN/UPC instead
+    (when it has a valid one).
+    """
+
+    def __init__(self, name, width, height, symbology='code128', bar_height=30, title_size=7):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.symbology = symbology
+        self.bar_height = bar_height
+        self.title_size = title_size
+
+    def code(self, label):
+        """:returns: What to encode for a label"""
+        if self.symbology == 'ean13' and label.linked_code:
+            return label.linked_code
+        return label.barcode
+
+    def symbology_for(self, data):
+        if self.symbology == 'ean13':
+            try:
+                encode(data, 'ean13')
+                return 'ean13'
+            except ValueError:  # not an EAN; fall back to Code 128
+                pass
+        return 'code128'
+
+    def layout(self, label):
+        """
+        :returns: Drawing operations: ``('barcode', x, y, data)`` and
+            ``('text', x, y, size, text, anchor)``, where ``anchor`` is
+            ``start`` or ``end``
+        """
+        pad = 4
+        ops = []
+        title = label.title or label.location or ''
+        if title:
+            ops.append(('text', pad, pad + self.title_size, self.title_size,
+                        fit(title, self.width - 2 * pad, self.title_size), 'start'))
+        top = pad + self.title_size + 3
+        data = self.code(label)
+        if self.symbology_for(data) != self.symbology:
+            data = label.barcode
+        ops.append(('barcode', pad, top, data))
+        below = top + self.bar_height + 9
+        ops.append(('text', pad, below, 7, data, 'start'))
+        if label.price is not None:
+            ops.append(('text', self.width - pad, below, 9, '${:.2f}'.format(label.price), 'end'))
+        if label.title and label.location:
+            ops.append(('text', pad, below + 8, 6,
+                        fit(label.location, self.width - 2 * pad, 6), 'start'))
+        return ops
+
+    def module_width(self, widths):
+        return min(1.5, (self.width - 8) / sum(widths))
+
+
+TEMPLATES = {
+    'item': LabelTemplate('item', 189, 72),
+    'item-ean': LabelTemplate('item-ean', 189, 72, symbology='ean13'),
+    'shelf': LabelTemplate('shelf', 189, 72, title_size=12, bar_height=26),
+    'large': LabelTemplate('large', 288, 144, title_size=12, bar_height=60),
+}
+
+
+def text_width(text, size):
+    # Helvetica averages a little over half an em per character
+    return len(text) * size * 0.55
+
+
+def fit(text, width, size):
+    """Shortens ``text`` to fit ``width`` points."""
+    most = max(1, int(width / (size * 0.55)))
+    return text if len(text) <= most else text[:most - 1].rstrip() + '…'
+
+
+def label_data(barcodes):
+    """
+    Reads what goes on each label, with one query per table.  Identifiers
+    with nothing attached (pre-printed label stock) get just their barcode.
+
+    :returns: A ``list`` of ``Label`` in the order of ``barcodes``
+    """
+    barcodes = list(barcodes)
+    found = {bc: Label(bc, Identifier.kind_of(bc), None, None, None, None) for bc in barcodes}
+    items = (ItemTemplate.objects.filter(identifier__in=barcodes)
+             .values_list('identifier_id', 'description', 'price__price',
+                          'stockbook__loc__name', 'identifier__linked_code'))
+    for bc, desc, price, loc, upc in items:
+        found[bc] = found[bc]._replace(title=desc, price=price, location=loc, linked_code=upc)
+    for bc, name in Location.objects.filter(identifier__in=barcodes).values_list('identifier_id',
+                                                                                 'name'):
+        found[bc] = found[bc]._replace(location=name)
+    return [found[bc] for bc in barcodes]
+
+
+def default_template(label):
+    return TEMPLATES['shelf' if label.kind == Identifier.Kind.LOC else 'item']
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rendered_barcode(data, template_name, fmt):
+    """
+    A barcode drawn at the origin, in one output format.  The template
+    sets the symbology, bar height and module width.
+    """
+    template = TEMPLATES[template_name]
+    symbology = template.symbology_for(data)
+    widths = encode(data, symbology)
+    module = template.module_width(widths)
+    return FORMATS[fmt].draw_bars(data, symbology, widths, module, template.bar_height)
+
+
+class SVG(object):
+    content_type = 'image/svg+xml'
+
+    @staticmethod
+    def draw_bars(data, symbology, widths, module, height):
+        path = ''.join('M{:.2f} 0h{:.2f}v{}h-{:.2f}z'.format(
+                           x * module, w * module, height, w * module)
+                       for x, w in bars(widths))
+        return '<path d="{}"/>'.format(path)
+
+    @classmethod
+    def draw(cls, ops, template):
+        out = []
+        for op in ops:
+            if op[0] == 'barcode':
+                x, y, data = op[1:]
+                drawing = rendered_barcode(data, template.name, 'svg')
+                out.append('<g transform="translate({} {})">{}</g>'.format(x, y, drawing))
+            else:
+                x, y, size, text, anchor = op[1:]
+                out.append('<text x="{}" y="{}" font-size="{}" text-anchor="{}">{}</text>'.format(
+                           x, y, size, anchor, escape(text)))
+        return ''.join(out)
+
+    @classmethod
+    def document(cls, pages, width, height):
+        """
+        :param pages: for each page, ``[(x, y, drawing)]``; SVG has no
+            pages, so they are stacked top to bottom
+        """
+        out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}pt" height="{1}pt" '
+               'viewBox="0 0 {0} {1}" font-family="Helvetica, Arial, sans-serif">'.format(
+                   width, height * len(pages))]
+        for ix, page in enumerate(pages):
+            for x, y, drawing in page:
+                out.append('<g transform="translate({} {})">{}</g>'.format(
+                           x, y + ix * height, drawing))
+        out.append('</svg>')
+        return ''.join(out).encode()
+
+
+class PDF(object):
+    content_type = 'application/pdf'
+
+    @staticmethod
+    def draw_bars(data, symbology, widths, module, height):
+        # drawn downwards from the origin; the page flips y
+        return ' '.join('{:.2f} 0 {:.2f} {} re'.format(x * module, w * module, height)
+                        for x, w in bars(widths)) + ' f'
+
+    @classmethod
+    def draw(cls, ops, template):
+        out = []
+        for op in ops:
+            if op[0] == 'barcode':
+                x, y, data = op[1:]
+                drawing = rendered_barcode(data, template.name, 'pdf')
+                out.append('q 1 0 0 1 {} {} cm {} Q'.format(x, y, drawing))
+            else:
+                x, y, size, text, anchor = op[1:]
+                if anchor == 'end':
+                    x -= text_width(text, size)
+                # undo the page's y flip for the glyphs
+                out.append('BT /F1 {} Tf 1 0 0 -1 {:.2f} {} Tm ({}) Tj ET'.format(
+                           size, x, y, pdf_string(text)))
+        return '\n'.join(out)
+
+    @classmethod
+    def document(cls, pages, width, height):
+        objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+                   '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                   '/Encoding /WinAnsiEncoding >>']
+        kids = []
+        for page in pages:
+            stream = '1 0 0 -1 0 {} cm\n'.format(height) + '\n'.join(
+                'q 1 0 0 1 {} {} cm\n{}\nQ'.format(x, y, drawing) for x, y, drawing in page)
+            stream = stream.encode('cp1252', 'replace')
+            objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+            objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {} {}] '
+                           '/Resources << /Font << /F1 3 0 R >> >> /Contents {} 0 R >>'.format(
+                               width, height, len(objects)))
+            kids.append('{} 0 R'.format(len(objects)))
+        objects[1] = '<< /Type /Pages /Kids [{}] /Count {} >>'.format(' '.join(kids), len(kids))
+
+        out = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for num, obj in enumerate(objects, 1):
+            offsets.append(len(out))
+            body = obj if isinstance(obj, bytes) else obj.encode()
+            out += b'%d 0 obj\n' % num + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % off for off in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+               len(objects) + 1, xref)
+        return bytes(out)
+
+
+def pdf_string(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class ZPL(object):
+    """
+    Zebra printers draw barcodes themselves, from ``^BC`` (Code 128) and
+    ``^BE`` (EAN-13) commands.  Labels come off a roll, so there are no
+    sheets: each label is its own ``^XA ... ^XZ`` format.
+    """
+    content_type = 'text/plain'
+
+    @staticmethod
+    def dots(points):
+        return int(round(points * ZPL_DPI / 72))
+
+    @classmethod
+    def draw_bars(cls, data, symbology, widths, module, height):
+        by = max(1, int(module * ZPL_DPI / 72))
+        if symbology == 'ean13':
+            # ^BE takes the 12 digits before the check digit, and adds it
+            return '^BY{}^BEN,{},N,N^FD{}^FS'.format(by, cls.dots(height),
+                                                     ean13_digits(data)[:12])
+        return '^BY{}^BCN,{},N,N,N^FD{}^FS'.format(by, cls.dots(height), data)
+
+    @classmethod
+    def draw(cls, ops, template):
+        out = []
+        for op in ops:
+            if op[0] == 'barcode':
+                x, y, data = op[1:]
+                drawing = rendered_barcode(data, template.name, 'zpl')
+                out.append('^FO{},{}{}'.format(cls.dots(x), cls.dots(y), drawing))
+            else:
+                x, y, size, text, anchor = op[1:]
+                h = cls.dots(size)
+                if anchor == 'end':
+                    x -= text_width(text, size)
+                # ^FO places the top of the text; y is its baseline
+                out.append('^FO{},{}^A0N,{},{}^FD{}^FS'.format(
+                           cls.dots(x), cls.dots(y - size), h, h, zpl_text(text)))
+        return '^XA^CI28{}^XZ'.format(''.join(out))
+
+    @classmethod
+    def document(cls, pages, width, height):
+        return '\n'.join(drawing for page in pages for x, y, drawing in page).encode() + b'\n'
+
+
+def zpl_text(text):
+    return text.replace('^', ' ').replace('~', ' ')
+
+
+FORMATS = {
+    'svg': SVG,
+    'pdf': PDF,
+    'zpl': ZPL,
+}
+
+
+def render(barcodes, fmt='svg', template=None, sheet=None):
+    """
+    Renders labels for identifiers, in the order given.
+
+    :param template: a ``TEMPLATES`` name, or ``None`` to use each label's
+        default (shelf labels for locations, item labels otherwise)
+    :param sheet: a ``SHEETS`` name to lay the labels out on pages, or
+        ``None`` for one label a page (ignored for ZPL)
+    :returns: ``(content, content type)``
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Unknown format '{}'".format(fmt))
+    if template is not None and template not in TEMPLATES:
+        raise ValueError("Unknown template '{}'".format(template))
+    if sheet is not None and sheet not in SHEETS:
+        raise ValueError("Unknown sheet '{}'".format(sheet))
+    backend = FORMATS[fmt]
+
+    drawn = []
+    for label in label_data(barcodes):
+        tpl = TEMPLATES[template] if template else default_template(label)
+        drawn.append((tpl, backend.draw(tpl.layout(label), tpl)))
+
+    if sheet is None or fmt == 'zpl':
+        width = max([tpl.width for tpl, d in drawn] or [0])
+        height = max([tpl.height for tpl, d in drawn] or [0])
+        pages = [[(0, 0, d)] for tpl, d in drawn]
+        return backend.document(pages, width, height), backend.content_type
+
+    layout = SHEETS[sheet]
+    per_page = layout.cols * layout.rows
+    pages = []
+    for start in range(0, len(drawn), per_page):
+        page = []
+        for ix, (tpl, d) in enumerate(drawn[start:start + per_page]):
+            row, col = divmod(ix, layout.cols)
+            page.append((layout.left + col * layout.col_pitch,
+                         layout.top + row * layout.row_pitch, d))
+        pages.append(page)
+    return backend.document(pages, layout.width, layout.height), backend.content_type
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Length
+
+from ...models import Identifier
+
+
+class Command(BaseCommand):
+    help = ("Sets Identifier.kind on rows saved before the column existed. "
+            "Safe to run more than once.")
+
+    def handle(self, *args, **options):
+        Kind = Identifier.Kind
+        widths = {Kind.LOC: Identifier.LOC_LEN, Kind.ITEM: Identifier.ITM_LEN}
+        qs = Identifier.idents.annotate(width=Length('barcode'))
+        with transaction.atomic():
+            for kind, width in widths.items():
+                # one UPDATE per kind; the regex runs once here, not per query
+                ct = (qs.filter(width=width, barcode__regex=r'^\d+$')
+                      .exclude(kind=kind).update(kind=kind))
+                self.stdout.write("{}: {} updated".format(kind.value, ct))
+            ct = (qs.exclude(width__in=widths.values(), barcode__regex=r'^\d+$')
+                  .exclude(kind=Kind.OTHER).update(kind=Kind.OTHER))
+        self.stdout.write("{}: {} updated".format(Kind.OTHER.value, ct))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Identifier, LinkedCode
+
+
+class Command(BaseCommand):
+    help = ("Adds a LinkedCode row for each Identifier.linked_code saved before "
+            "the table existed.  Safe to run more than once.")
+
+    def handle(self, *args, **options):
+        rows = (Identifier.idents.exclude(linked_code__isnull=True).exclude(linked_code='')
+                .filter(linked_codes__isnull=True).values_list('barcode', 'linked_code'))
+        codes = [LinkedCode(code=code, identifier_id=barcode) for barcode, code in rows]
+        # a code already linked elsewhere keeps its current identifier
+        LinkedCode.objects.bulk_create(codes, batch_size=1000, ignore_conflicts=True)
+        self.stdout.write("{} codes linked".format(len(codes)))
@@ -0,0 +1,40 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...utils import check_digit, check_digits, valid_codes
+
+
+class Command(BaseCommand):
+    help = "Times Damm check digits over a batch of random codes, one at a time and batched."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000)
+        parser.add_argument('--width', type=int, default=7,
+                            help="digits per code, check digit included")
+
+    def handle(self, *args, **options):
+        width = options['width'] - 1
+        values = ['{:0{}d}'.format(random.randrange(10 ** width), width)
+                  for ix in range(options['count'])]
+
+        start = time.perf_counter()
+        digits = [check_digit(val) for val in values]
+        self.report('check_digit() loop', start)
+
+        start = time.perf_counter()
+        batched = check_digits(values)
+        self.report('check_digits()', start)
+
+        codes = ['{}{}'.format(val, cd) for val, cd in zip(values, batched)]
+        start = time.perf_counter()
+        valid = valid_codes(codes)
+        self.report('valid_codes()', start)
+
+        ok = batched == digits and all(valid)
+        self.stdout.write("Results {}".format('agree' if ok else 'DISAGREE'))
+
+    def report(self, label, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write("{:<20} {:.3f}s".format(label, elapsed))
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...models import BlockAllocator, Sequence
+
+
+class Command(BaseCommand):
+    help = ("Draws numbers from a scratch Sequence with parallel threads, the way "
+            "concurrent item creation does, and checks that none is handed out twice.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--count', type=int, default=500,
+                            help="numbers drawn by each thread")
+        parser.add_argument('--block-size', type=int, default=1,
+                            help="numbers each thread reserves at a time")
+
+    def handle(self, *args, **options):
+        name = 'benchmark'
+        Sequence.objects.filter(name=name).delete()
+        drawn = []
+        errors = []
+
+        def worker():
+            # one allocator per thread stands in for one per process
+            allocator = BlockAllocator(name, block_size=options['block_size'])
+            numbers = []
+            try:
+                for ix in range(options['count']):
+                    numbers.append(allocator.next())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+            drawn.extend(numbers)
+
+        threads = [threading.Thread(target=worker) for ix in range(options['threads'])]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        Sequence.objects.filter(name=name).delete()
+
+        if errors:
+            raise CommandError("{} thread(s) failed: {}".format(len(errors), errors[0]))
+        dups = [n for n, ct in Counter(drawn).items() if ct > 1]
+        self.stdout.write("{} numbers from {} threads in {:.2f}s ({:.0f}/s)".format(
+                          len(drawn), options['threads'], elapsed, len(drawn) / elapsed))
+        if dups:
+            raise CommandError("{} numbers handed out more than once".format(len(dups)))
+        self.stdout.write("No duplicates")
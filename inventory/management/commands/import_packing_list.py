@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Invoice, Supplier
+from ...packing import import_packing_list
+
+
+class Command(BaseCommand):
+    help = ("Receives a supplier's CSV/TSV packing list (code, quantity, unit cost) "
+            "against a new or existing invoice.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="the packing list, or - for standard input")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--vendor', type=int, help="supplier ID, for a new invoice")
+        group.add_argument('--invoice', type=int, help="an existing invoice ID")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="lines looked up and written together")
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if options['invoice']:
+            invoice = Invoice.objects.filter(id=options['invoice']).first()
+            if invoice is None:
+                raise CommandError("Invoice #{} not found".format(options['invoice']))
+        else:
+            vendor = Supplier.objects.filter(id=options['vendor']).first()
+            if vendor is None:
+                raise CommandError("Supplier #{} not found".format(options['vendor']))
+            invoice = Invoice(vendor=vendor)
+
+        if options['path'] == '-':
+            report = import_packing_list(sys.stdin, invoice, options['chunk_size'])
+        else:
+            with open(options['path'], newline='', encoding=options['encoding']) as fh:
+                report = import_packing_list(fh, invoice, options['chunk_size'])
+
+        for line in report['unmatched_lines']:
+            self.stdout.write("line {line}: {code!r} {reason}".format(**line))
+        self.stdout.write("Invoice #{invoice}: {matched} of {lines} lines received, "
+                          "{unmatched} unmatched".format(**report))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...printing import run
+
+
+class Command(BaseCommand):
+    help = "Prints queued labels to the LABEL_PRINTER device or spool directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destination', default=None,
+                            help="device file or spool directory (default: LABEL_PRINTER)")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="jobs claimed and rendered together")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="seconds between polls of an empty queue")
+        parser.add_argument('--once', action='store_true',
+                            help="exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        destination = options['destination'] or settings.LABEL_PRINTER
+        total = run(destination, batch_size=options['batch_size'],
+                    interval=options['interval'], once=options['once'],
+                    stdout=self.stdout)
+        self.stdout.write("Printed {} labels to {}".format(total, destination))
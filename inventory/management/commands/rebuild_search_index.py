@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ...search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the item search index from the ItemTemplate table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="index rows written per INSERT")
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write("Indexed {} items".format(count))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from ...summaries import refresh
+
+
+class Command(BaseCommand):
+    help = ("Recomputes each invoice's purchase totals from its Purchase rows, for "
+            "invoices saved before the totals were kept.  Safe to run more than once.")
+
+    def handle(self, *args, **options):
+        count = refresh()
+        self.stdout.write("{} invoices refreshed".format(count))
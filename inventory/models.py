@@ -1,54 +1,193 @@
-from django.db import models
-from django.db.models import Max
+import threading
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Max, OuterRef, Subquery
 from django.urls import reverse
 
-from .utils import check_digit
+from .utils import check_digit, check_digits
+
+
+class Sequence(models.Model):
+    """
+    A named counter.  Numbers are handed out under a row lock, so concurrent
+    callers never receive the same one.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    @classmethod
+    def reserve(cls, name, count=1, seed=None):
+        """
+        :param seed: called for the first value when the counter does not
+            exist yet; defaults to 1
+        :returns: The ``range`` of ``count`` numbers reserved
+        """
+        counter = cls.objects.filter(name=name)
+        with transaction.atomic():
+            # the UPDATE takes the row lock before anything is read
+            bumped = counter.update(next_value=F('next_value') + count)
+            if not bumped:
+                try:
+                    with transaction.atomic():
+                        first = seed() if seed else 1
+                        cls.objects.create(name=name, next_value=first + count)
+                except IntegrityError:  # created by someone else meanwhile
+                    counter.update(next_value=F('next_value') + count)
+            last = counter.values_list('next_value', flat=True).get()
+        return range(last - count, last)
+
+    def __str__(self):
+        return '{} @ {}'.format(self.name, self.next_value)
+
+
+class BlockAllocator(object):
+    """
+    Hands out numbers from a ``Sequence``, reserving ``block_size`` of them
+    at a time so most calls need no query at all.  Numbers left in a block
+    when the process exits are never used.
+
+    A block is only kept when its reservation commits by itself.  Inside an
+    outer transaction, which may yet roll the reservation back, ``next()``
+    reserves just the number it returns.
+    """
+
+    def __init__(self, name, seed=None, block_size=1, stop=None):
+        self.name = name
+        self.seed = seed
+        self.block_size = block_size
+        self.stop = stop    # numbers must be below it
+        self.block = range(0)
+        self.lock = threading.Lock()
+
+    def reserve(self, count):
+        """
+        :returns: A fresh ``range`` of ``count`` contiguous numbers, leaving
+            the current block for ``next()``
+        :raises ValueError: if they would pass ``stop``; nothing is reserved
+        """
+        with transaction.atomic():
+            numbers = Sequence.reserve(self.name, count, self.seed)
+            if self.stop is not None and numbers.stop > self.stop:
+                # raised inside the transaction, so the reservation is undone
+                raise ValueError('Only {} left'.format(max(0, self.stop - numbers.start)))
+        return numbers
+
+    def next(self):
+        if transaction.get_connection().in_atomic_block:
+            return self.reserve(1)[0]
+        with self.lock:
+            if not self.block:
+                try:
+                    self.block = self.reserve(self.block_size)
+                except ValueError:  # the last numbers, fewer than a block
+                    self.block = self.reserve(1)
+            value = self.block[0]
+            self.block = self.block[1:]
+            return value
 
 
 class LocIdManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(barcode__regex=r'^\d{4}$')
+        return super().get_queryset().filter(kind=Identifier.Kind.LOC)
 
 
 class ItemIdManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(barcode__regex=r'^\d{7}$')
+        return super().get_queryset().filter(kind=Identifier.Kind.ITEM)
+
+
+def next_after_max(length, first):
+    """
+    Seeds an allocator: the number after the highest existing ID of
+    ``length`` digits (less its check digit), or ``first``.  IDs are found
+    by their barcode, not their ``kind``, which rows saved before it existed
+    only get from ``backfill_identifier_kind``.
+    """
+    ids = Identifier.idents.filter(barcode__regex=r'^[0-9]{{{}}}$'.format(length))
+    bcm = ids.aggregate(Max('barcode'))['barcode__max']
+    return 1 + int(bcm[:-1]) if bcm else first
 
 
 class Identifier(models.Model):
+
+    class Kind(models.TextChoices):
+        LOC = 'LOC'
+        ITEM = 'ITM'
+        OTHER = 'OTHER'
+
     barcode = models.CharField(max_length=8, primary_key=True)
+    # the most recently linked of its LinkedCode rows, for display; codes
+    # are looked up through LinkedCode
     linked_code = models.CharField(max_length=16, null=True, blank=True)
+    kind = models.CharField(max_length=5, choices=Kind.choices, default=Kind.OTHER,
+                            editable=False, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
 
     LOC_LEN = 4     # Loc_IDs are four (4) digits
     ITM_LEN = 7     # Itm_IDs are seven (7) digits
+    ID_BLOCK = 1    # IDs each process reserves at a time
 
     idents = models.Manager()   # default manager
     locIDs = LocIdManager()
     itemIDs = ItemIdManager()
 
+    # numbers keep their length: 100-999 for locations, 100000-999999 for items
+    loc_numbers = BlockAllocator('locid', block_size=ID_BLOCK, stop=1000,
+                                 seed=lambda: next_after_max(Identifier.LOC_LEN, 100))
+    item_numbers = BlockAllocator('itemid', block_size=ID_BLOCK, stop=1000000,
+                                  seed=lambda: next_after_max(Identifier.ITM_LEN, 100000))
+
     @classmethod
     def make_loc_id(self):
-        qs = self.locIDs.aggregate(Max('barcode'))
-        bcm = qs['barcode__max']
-        if bcm:     # chop last digit, add one
-            val = '{}'.format(1+int(bcm[0:3]))
-        else:
-            val = '100'
+        val = '{}'.format(self.loc_numbers.next())
         id = '{}{}'.format(val, check_digit(val))
         return id
 
     @classmethod
     def make_item_id(self):
-        qs = self.itemIDs.aggregate(Max('barcode'))
-        bcm = qs['barcode__max']
-        if bcm:     # chop last digit, add one
-            val = '{}'.format(1+int(bcm[0:6]))
-        else:
-            val = '100000'
+        val = '{}'.format(self.item_numbers.next())
         id = '{}{}'.format(val, check_digit(val))
         return id
 
+    @classmethod
+    def make_loc_ids(self, count):
+        return self.create_batch(self.loc_numbers, count)
+
+    @classmethod
+    def make_item_ids(self, count):
+        return self.create_batch(self.item_numbers, count)
+
+    @classmethod
+    def create_batch(self, allocator, count):
+        """
+        Creates ``count`` identifiers numbered from one contiguous range,
+        with a single multi-row INSERT per thousand.
+
+        :returns: The new barcodes, in order
+        :raises ValueError: if the allocator has fewer than ``count`` left
+        """
+        with transaction.atomic():
+            numbers = allocator.reserve(count)
+            values = ['{}'.format(n) for n in numbers]
+            barcodes = ['{}{}'.format(val, cd) for val, cd in zip(values, check_digits(values))]
+            self.idents.bulk_create([self(barcode=bc, kind=self.kind_of(bc))
+                                     for bc in barcodes], batch_size=1000)
+        return barcodes
+
+    @classmethod
+    def kind_of(cls, barcode):
+        barcode = '{}'.format(barcode)
+        if barcode.isdigit():
+            if len(barcode) == cls.LOC_LEN:
+                return cls.Kind.LOC
+            if len(barcode) == cls.ITM_LEN:
+                return cls.Kind.ITEM
+        return cls.Kind.OTHER
+
+    def save(self, *args, **kwargs):
+        self.kind = self.kind_of(self.barcode)
+        super().save(*args, **kwargs)
+
     def urlize(self):
         return reverse('identifier-detail', kwargs={'pk': self.barcode})
 
@@ -59,6 +198,45 @@ class Identifier(models.Model):
         ordering = ['barcode']
 
 
+class LinkedCode(models.Model):
+    """
+    A supplier's code (UPC, EAN, ...) for an identifier.  An identifier may
+    have many; ``Identifier.linked_code`` mirrors the one linked most
+    recently.
+    """
+    #   id
+    code = models.CharField(max_length=16, unique=True)
+    identifier = models.ForeignKey(Identifier, on_delete=models.CASCADE,
+                                   related_name='linked_codes')
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @classmethod
+    def link(cls, identifier, code):
+        """Links a code to an identifier, and makes it the one it shows."""
+        with transaction.atomic():
+            Identifier.idents.filter(pk=identifier.pk).update(linked_code=code)
+            identifier.linked_code = code
+            cls.claim(identifier, code)
+
+    @classmethod
+    def claim(cls, identifier, code):
+        """
+        Makes ``code`` the identifier's, taking it from any other.  An
+        identifier that loses the code it showed shows its latest other one.
+        """
+        previous = (cls.objects.filter(code=code).exclude(identifier_id=identifier.pk)
+                    .values_list('identifier_id', flat=True).first())
+        cls.objects.update_or_create(code=code, defaults={'identifier_id': identifier.pk})
+        if previous is not None:
+            latest = (cls.objects.filter(identifier_id=OuterRef('pk'))
+                      .order_by('-created', '-id').values('code')[:1])
+            Identifier.idents.filter(pk=previous, linked_code=code).update(
+                linked_code=Subquery(latest))
+
+    def __str__(self):
+        return '{} -> {}'.format(self.code, self.identifier_id)
+
+
 class Location(models.Model):
     identifier = models.OneToOneField(Identifier, on_delete=models.CASCADE,
                                       primary_key=True)
@@ -69,7 +247,7 @@ class Location(models.Model):
         return '{}'.format(self.name)
 
     class Meta:
-        ordering = ['identifier']
+        ordering = ['identifier_id']   # the key column; avoids a join
 
 
 class Supplier(models.Model):
@@ -105,14 +283,36 @@ class ItemTemplate(models.Model):
     out_of_stock = models.BooleanField(default=False)
     notes = models.TextField(null=True, blank=True)
 
+    @staticmethod
+    def yardage_type(yardage):
+        return 1 if yardage is True else 0
+
     def type_item(self):
-        return 1 if self.yardage is True else 0
+        return self.yardage_type(self.yardage)
 
     def __str__(self):
         return '{}'.format(self.description)
 
     class Meta:
-        ordering = ['identifier']
+        ordering = ['identifier_id']   # the key column; avoids a join
+
+
+class ItemTerm(models.Model):
+    """
+    One word of an item's searchable text; the inverted index behind
+    ``/api/item/search``.  Rows are maintained by ``inventory.search``.
+    """
+    #   id
+    term = models.CharField(max_length=32)
+    item = models.ForeignKey(ItemTemplate, on_delete=models.CASCADE,
+                             related_name='terms')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return '{} -> {}'.format(self.term, self.item_id)
+
+    class Meta:
+        unique_together = ['term', 'item']  # term first: index serves prefix scans
 
 
 class Picture(models.Model):
@@ -136,7 +336,7 @@ class StockBook(models.Model):
     units = models.DecimalField(max_digits=8, decimal_places=3,
                                 null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
-    updated = models.DateTimeField(auto_now=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return 'Stock Record for Item {}'.format(self.itm_id)
@@ -147,7 +347,7 @@ class Price(models.Model):
     itm = models.OneToOneField(ItemTemplate, on_delete=models.CASCADE,
                                primary_key=True)
     price = models.DecimalField(max_digits=6, decimal_places=2,
-                                null=True, blank=True)
+                                null=True, blank=True, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -160,6 +360,10 @@ class Invoice(models.Model):
     # id    (>100)
     vendor = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     received = models.DateTimeField(auto_now_add=True)
+    # running totals of the invoice's purchases; see summaries.py
+    lines = models.PositiveIntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_units = models.DecimalField(max_digits=12, decimal_places=3, default=0)
 
     def __str__(self):
         return 'Invoice #{} from {}'.format(self.id, self.vendor.name)
@@ -171,6 +375,8 @@ class Purchase(models.Model):
     item = models.ForeignKey(ItemTemplate, on_delete=models.CASCADE)
     cost = models.DecimalField(max_digits=8, decimal_places=2,
                                null=True, blank=True)
+    units = models.DecimalField(max_digits=8, decimal_places=3,
+                                null=True, blank=True)
 
     def __str__(self):
         return 'Inv:{} Item:{}'.format(self.invoice_id, self.item_id)
@@ -195,7 +401,7 @@ class Receipt(models.Model):
                                  null=True, blank=True)
     adjusted = models.DecimalField(max_digits=8, decimal_places=2,
                                    null=True, blank=True)
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
     updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -211,7 +417,42 @@ class ItemSale(models.Model):
     amount = models.DecimalField(max_digits=8, decimal_places=2)
     adjusted = models.DecimalField(max_digits=8, decimal_places=2,
                                    null=True, blank=True)
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return 'ItemSale #{} :: {}'.format(self.id, self.receipt.id)
+
+
+class PrintJob(models.Model):
+    """
+    A label waiting for the print spooler (``manage.py print_spooler``).
+    Repeated requests for a label that is still pending are folded into one
+    job, counted in ``requests``.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PEND'
+        PRINTING = 'PRNT'
+        DONE = 'DONE'
+        FAILED = 'FAIL'
+
+    # id
+    identifier = models.ForeignKey(Identifier, on_delete=models.CASCADE,
+                                   related_name='print_jobs')
+    format = models.CharField(max_length=4, default='zpl')
+    template = models.CharField(max_length=16, blank=True)
+    status = models.CharField(max_length=4, choices=Status.choices,
+                              default=Status.PENDING, db_index=True)
+    requests = models.PositiveIntegerField(default=1)
+    worker = models.CharField(max_length=64, blank=True)
+    output = models.CharField(max_length=255, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        lbl = self.Status[self.status].label
+        return 'Print job #{} :: {} -- {}'.format(self.id, self.identifier_id, lbl)
+
+    class Meta:
+        ordering = ['id']
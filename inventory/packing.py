@@ -0,0 +1,165 @@
+"""
+Importing a supplier's packing list: a CSV or TSV file with a line for
+each item shipped, giving its code (our barcode, or a UPC or supplier code
+linked to one), the quantity and the unit cost.
+
+The file is read a chunk of lines at a time.  Each chunk's codes are
+looked up together and its stock changes written in bulk, so memory and
+queries grow with the chunk size and the number of distinct items, not
+with the length of the file.
+"""
+import csv
+from decimal import Decimal, DecimalException
+from itertools import chain, islice
+
+from django.db import transaction
+
+from .models import Invoice
+from .receiving import add_costs, add_stock
+from .scans import lookup_many
+
+# header names that pick out the columns; without a header, the columns
+# are code, quantity and unit cost, in that order
+HEADERS = {
+    'code': {'code', 'sku', 'upc', 'ean', 'barcode', 'item'},
+    'quantity': {'quantity', 'qty', 'units', 'count'},
+    'cost': {'cost', 'unit cost', 'unit_cost', 'unit price', 'unit_price'},
+}
+COLUMNS = {'code': 0, 'quantity': 1, 'cost': 2}
+MAX_UNMATCHED = 1000    # unmatched lines listed in a report
+CENT = Decimal('0.01')
+
+
+def read_rows(lines):
+    """
+    :param lines: the lines of text of the file
+    :returns: An iterator of ``(line number, fields)``; a tab in the first
+        line makes it TSV, otherwise CSV
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    delimiter = '\t' if '\t' in first else ','
+    reader = csv.reader(chain([first], lines), delimiter=delimiter)
+    for row in reader:
+        if any(field.strip() for field in row):
+            yield reader.line_num, row
+
+
+def header_columns(row):
+    """:returns: The ``COLUMNS`` a header row names, or ``None`` if it is not one"""
+    names = [field.strip().lower() for field in row]
+    columns = {}
+    for col, aliases in HEADERS.items():
+        for ix, name in enumerate(names):
+            if name in aliases:
+                columns[col] = ix
+                break
+    if 'code' not in columns or 'quantity' not in columns:
+        return None
+    return columns
+
+
+def parse_row(row, columns):
+    """
+    :returns: ``(code, quantity, unit cost)``; the cost may be ``None``
+    :raises ValueError: for a line that cannot be read
+    """
+    def field(col):
+        ix = columns.get(col)
+        return row[ix].strip() if ix is not None and ix < len(row) else ''
+
+    code = field('code')
+    if not code:
+        raise ValueError('No code')
+    try:
+        quantity = Decimal(field('quantity'))
+        cost = Decimal(field('cost').lstrip('$')) if field('cost') else None
+    except DecimalException:
+        raise ValueError('Bad quantity or cost')
+    if not quantity.is_finite() or quantity <= 0:
+        raise ValueError('Bad quantity or cost')
+    if cost is not None and (not cost.is_finite() or cost < 0):
+        raise ValueError('Bad quantity or cost')
+    return code, quantity, cost
+
+
+def import_packing_list(lines, invoice, chunk_size=1000):
+    """
+    Receives the items on a packing list against an invoice: their units
+    are added to the stock, and their costs to the invoice's purchases.
+    The whole file is imported in one transaction.
+
+    :param invoice: an ``Invoice``; one not yet saved is saved with the
+        import
+    :returns: A report of the lines read, matched and not matched
+    """
+    report = {'invoice': None, 'lines': 0, 'matched': 0, 'unmatched': 0,
+              'units': Decimal(0), 'cost': Decimal(0), 'unmatched_lines': []}
+    costs = {}      # for each item, written once at the end
+    received = {}
+    rows = read_rows(lines)
+    with transaction.atomic():
+        if invoice.pk is None:
+            invoice.save()
+        else:
+            invoice = Invoice.objects.select_for_update().get(pk=invoice.pk)
+        report['invoice'] = invoice.id
+
+        first = next(rows, None)
+        columns = header_columns(first[1]) if first else None
+        if columns is None:
+            columns = COLUMNS
+            if first:
+                rows = chain([first], rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            import_chunk(chunk, columns, report, costs, received)
+        add_costs(invoice, costs, received)
+    return report
+
+
+def import_chunk(chunk, columns, report, costs, received):
+    """
+    Adds one chunk's units to the stock, and its costs and units to
+    ``costs`` and ``received``: a purchase is one row for each item on the
+    invoice, so its totals are kept until the end of the file rather than
+    rewritten for every chunk.
+    """
+    parsed = []
+    misses = []     # (line number, code, reason)
+    for num, row in chunk:
+        report['lines'] += 1
+        try:
+            parsed.append((num,) + parse_row(row, columns))
+        except ValueError as e:
+            code = row[columns['code']] if columns['code'] < len(row) else ''
+            misses.append((num, code.strip(), str(e)))
+
+    scans = lookup_many([code for num, code, quantity, cost in parsed])
+    units = {}
+    for num, code, quantity, cost in parsed:
+        scan = scans[code]
+        if scan is None:
+            misses.append((num, code, 'Unknown code'))
+            continue
+        if scan.item is None:
+            misses.append((num, code, 'Not an item'))
+            continue
+        units[scan.barcode] = units.get(scan.barcode, 0) + quantity
+        received[scan.barcode] = received.get(scan.barcode, 0) + quantity
+        report['units'] += quantity
+        line_cost = (quantity * cost).quantize(CENT) if cost is not None else 0
+        costs[scan.barcode] = costs.get(scan.barcode, 0) + line_cost
+        report['cost'] += line_cost
+        report['matched'] += 1
+
+    add_stock(units)
+
+    report['unmatched'] += len(misses)
+    room = MAX_UNMATCHED - len(report['unmatched_lines'])
+    report['unmatched_lines'] += [{'line': num, 'code': code, 'reason': reason}
+                                  for num, code, reason in sorted(misses)[:room]]
@@ -0,0 +1,176 @@
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField
+from django.urls import reverse
+from restless.preparers import FieldsPreparer
+
+
+class ReverseFormatter(object):
+    """
+    Builds detail URLs from a primary key without calling ``reverse()`` for
+    every row.  The URL pattern is reversed once and kept as a template.
+    """
+    MARKER = 9081726354
+
+    def __init__(self, name, kwarg='pk'):
+        self.name = name
+        self.kwarg = kwarg
+        self.template = None
+
+    def __call__(self, pk):
+        if self.template is None:
+            url = reverse(self.name, kwargs={self.kwarg: self.MARKER})
+            self.template = url.replace(str(self.MARKER), '{}')
+        return self.template.format(pk)
+
+
+class ValuesPreparer(FieldsPreparer):
+    """
+    A ``FieldsPreparer`` that can also prepare a whole queryset at once.
+
+    The dotted lookups in ``fields`` are compiled (once per model) into
+    ``values_list()`` columns, so list endpoints fetch only the columns they
+    expose and never instantiate models.  Lookups that are not plain fields
+    -- model methods, mostly -- must be listed in ``computed`` as
+    ``lookup: (column, function)``; the function receives the column value.
+
+    Single objects (detail endpoints) are prepared exactly as before.
+
+    ``nested`` maps output keys that hold a foreign key onto the preparer
+    for the related model; those keys are expanded in place into the related
+    record, read through the same query (see ``expand``).
+    """
+
+    def __init__(self, fields, computed=None, nested=None):
+        super(ValuesPreparer, self).__init__(fields)
+        self.computed = computed or {}
+        self.nested = nested or {}
+        self.plans = {}
+        self.subsets = {}
+        self.expansions = {}
+
+    def prepare(self, data):
+        result = super(ValuesPreparer, self).prepare(data)
+        for key, (relation, preparer) in self.nested.items():
+            if result.get(key) is not None:
+                result[key] = preparer.prepare(getattr(data, relation))
+        return result
+
+    def subset(self, names):
+        """
+        :returns: A preparer for just the named output fields (kept in their
+            declared order), sharing this one's computed lookups
+        """
+        key = frozenset(names)
+        if key not in self.subsets:
+            fields = {k: v for k, v in self.fields.items() if k in key}
+            nested = {k: v for k, v in self.nested.items() if k in key}
+            self.subsets[key] = ValuesPreparer(fields, computed=self.computed,
+                                               nested=nested)
+        return self.subsets[key]
+
+    def expand(self, relations):
+        """
+        :param relations: ``{output key: (relation name, preparer)}`` for the
+            foreign keys to expand; keys this preparer does not output are
+            ignored
+        :returns: A preparer that embeds those related records
+        """
+        nested = dict(self.nested)
+        nested.update({k: v for k, v in relations.items() if k in self.fields})
+        key = frozenset(nested.items())
+        if key not in self.expansions:
+            self.expansions[key] = ValuesPreparer(self.fields, computed=self.computed,
+                                                  nested=nested)
+        return self.expansions[key]
+
+    def compile(self, model):
+        """
+        :returns: ``(columns, build)`` where ``build(row)`` turns one row of
+            ``values_list(*columns)`` into the prepared ``dict``, or ``None``
+            if some lookup cannot be read from columns
+        """
+        if model not in self.plans:
+            self.plans[model] = self.make_plan(model)
+        return self.plans[model]
+
+    def make_plan(self, model, prefix=''):
+        columns = []
+        keys = []
+        converters = []
+        expansions = []
+        for key, lookup in self.fields.items():
+            if lookup in self.computed:
+                column, func = self.computed[lookup]
+                column = prefix + column
+                converters.append((key, func))
+            else:
+                column = self.lookup_column(model, lookup)
+                if column is None:
+                    return None
+                column = prefix + column
+            if column not in columns:
+                columns.append(column)
+            keys.append((key, columns.index(column)))
+
+        for key, (relation, preparer) in self.nested.items():
+            fld = model._meta.get_field(relation)
+            plan = preparer.make_plan(fld.related_model, prefix + relation + '__')
+            if plan is None:
+                return None
+            sub_columns, sub_build = plan
+            start = len(columns)
+            columns.extend(sub_columns)
+            expansions.append((key, sub_build, start, len(columns)))
+
+        names = tuple(key for key, ix in keys)
+        if len(keys) == 1:
+            ix = keys[0][1]
+            getter = lambda row: (row[ix],)     # noqa: E731
+        else:
+            getter = itemgetter(*[ix for key, ix in keys])
+
+        def build(row):
+            d = dict(zip(names, getter(row)))
+            for key, func in converters:
+                d[key] = func(d[key])
+            for key, sub_build, start, end in expansions:
+                if d[key] is not None:  # a null foreign key stays null
+                    d[key] = sub_build(row[start:end])
+            return d
+
+        return columns, build
+
+    def lookup_column(self, model, lookup):
+        """
+        Maps a dotted lookup (``identifier.linked_code``) onto a ``values()``
+        column (``identifier__linked_code``), or returns ``None``.
+        """
+        parts = lookup.split('.')
+        path = []
+        for ix, part in enumerate(parts):
+            last = ix == len(parts) - 1
+            if part == 'pk':
+                path.append(model._meta.pk.name)
+                return '__'.join(path) if last else None
+            try:
+                fld = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            if not fld.concrete:
+                return None
+            if fld.is_relation:
+                if part == fld.attname and last:    # the raw key, e.g. loc_id
+                    path.append(part)
+                    return '__'.join(path)
+                if last:    # the related object itself
+                    return None
+                path.append(fld.name)
+                model = fld.related_model
+                continue
+            path.append(fld.name)
+            if isinstance(fld, FileField) and parts[ix + 1:] == ['name']:
+                return '__'.join(path)  # the stored value is the file name
+            return '__'.join(path) if last else None
+        return None
@@ -0,0 +1,146 @@
+"""
+The label print queue.  Requests only add ``PrintJob`` rows; the spooler
+(``manage.py print_spooler``) renders them in batches and writes them to
+``settings.LABEL_PRINTER`` -- a printer device file, or a spool directory
+that gets one file a batch.
+"""
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import labels
+from .models import Identifier, PrintJob
+
+
+def enqueue(barcode, fmt=None, template=''):
+    """
+    Queues a label, or counts one more request on the same label if it is
+    still waiting to print.
+
+    :returns: The ``PrintJob``
+    """
+    fmt = fmt or settings.LABEL_FORMAT
+    if fmt not in labels.FORMATS:
+        raise ValueError("Unknown format '{}'".format(fmt))
+    if template and template not in labels.TEMPLATES:
+        raise ValueError("Unknown template '{}'".format(template))
+
+    pending = PrintJob.objects.filter(identifier_id=barcode, format=fmt, template=template,
+                                      status=PrintJob.Status.PENDING)
+    with transaction.atomic():
+        # the identifier's row lock keeps two requests for a label from both
+        # finding no pending job, and both adding one
+        Identifier.idents.select_for_update().filter(barcode=barcode).values_list('pk').first()
+        if pending.update(requests=F('requests') + 1, updated=timezone.now()):
+            job = pending.order_by('id').first()
+            if job is not None:
+                return job
+        return PrintJob.objects.create(identifier_id=barcode, format=fmt, template=template)
+
+
+def worker_name():
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])[:64]
+
+
+def claim(worker, limit=100):
+    """
+    Takes up to ``limit`` pending jobs for one worker.  The claim is a
+    conditional UPDATE, so two spoolers never take the same job.
+    """
+    pending = PrintJob.objects.filter(status=PrintJob.Status.PENDING)
+    ids = list(pending.order_by('id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    pending.filter(id__in=ids).update(status=PrintJob.Status.PRINTING, worker=worker,
+                                      updated=timezone.now())
+    return list(PrintJob.objects.filter(id__in=ids, status=PrintJob.Status.PRINTING,
+                                        worker=worker).order_by('id'))
+
+
+def requeue_stale(max_age=timedelta(minutes=10)):
+    """Returns jobs left ``PRINTING`` by a spooler that died to the queue."""
+    stale = PrintJob.objects.filter(status=PrintJob.Status.PRINTING,
+                                    updated__lt=timezone.now() - max_age)
+    return stale.update(status=PrintJob.Status.PENDING, worker='')
+
+
+def spool(jobs, destination=None):
+    """
+    Renders claimed jobs, one document for each format and template, and
+    writes them out.  A label asked for twice (by jobs enqueued at the same
+    moment) is rendered once.
+
+    :returns: The number of jobs printed
+    """
+    destination = destination or settings.LABEL_PRINTER
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job.format, job.template), []).append(job)
+
+    printed = 0
+    for (fmt, template), group in groups.items():
+        barcodes = list(dict.fromkeys(job.identifier_id for job in group))
+        ids = [job.id for job in group]
+        try:
+            content, content_type = labels.render(barcodes, fmt, template=template or None)
+            output = write(content, destination, '{}-{}'.format(ids[0], len(ids)), fmt)
+        except Exception as e:  # anything uncaught would leave the jobs PRINTING
+            PrintJob.objects.filter(id__in=ids).update(status=PrintJob.Status.FAILED,
+                                                       error=str(e)[:255],
+                                                       updated=timezone.now())
+            continue
+        PrintJob.objects.filter(id__in=ids).update(status=PrintJob.Status.DONE,
+                                                   output=output[:255], error='',
+                                                   updated=timezone.now())
+        printed += len(ids)
+    return printed
+
+
+def write(content, destination, name, extension):
+    """
+    Appends to a device file, or adds a file to a spool directory.  Any
+    destination that is not an existing file is taken as a directory, and
+    made if need be.  Spool files appear whole: they are written under a
+    temporary name first.
+
+    :returns: The path written
+    """
+    if not os.path.exists(destination) or os.path.isdir(destination):
+        os.makedirs(destination, exist_ok=True)
+        path = os.path.join(destination, 'labels-{}.{}'.format(name, extension))
+        partial = path + '.part'
+        with open(partial, 'wb') as fh:
+            fh.write(content)
+        os.replace(partial, path)
+        return path
+    with open(destination, 'ab') as fh:
+        fh.write(content)
+    return destination
+
+
+def run(destination=None, batch_size=100, interval=1.0, once=False, stdout=None):
+    """
+    The spooler loop: claims and prints pending jobs until the queue is
+    empty, then polls every ``interval`` seconds (or returns, if ``once``).
+    """
+    worker = worker_name()
+    requeue_stale()
+    total = 0
+    while True:
+        jobs = claim(worker, batch_size)
+        if jobs:
+            count = spool(jobs, destination)
+            total += count
+            if stdout:
+                stdout.write("Printed {} of {} labels".format(count, len(jobs)))
+            continue
+        if once:
+            return total
+        time.sleep(interval)
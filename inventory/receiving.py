@@ -0,0 +1,244 @@
+"""
+Receiving stock against an invoice.
+
+A line gives what arrived of one item: ``units`` is the quantity received,
+added to the stock on hand and to the item's purchase on the invoice;
+``cost`` adds to the purchase too, and ``price`` sets the selling price.
+Lines for the same item add up.  ``receive`` applies many lines in one
+transaction, with a fixed number of queries however many there are.
+
+The purchasing form (``/api/itemdata``) edits one item at a time, and its
+``units`` are the stock on hand: ``set_units`` writes them only if they
+changed.  What it received is sent apart, and ``add_cost`` adds it and the
+cost to the purchase in one UPDATE that needs nothing read first.
+"""
+from decimal import Decimal, DecimalException
+
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Invoice, ItemTemplate, Price, Purchase, StockBook
+from .summaries import add_to_invoice
+
+FIELDS = ['units', 'cost', 'price']
+
+
+def parse_lines(lines):
+    """
+    Checks received lines and converts their amounts to ``Decimal``.
+
+    :returns: ``(lines, errors)``; ``errors`` maps a line's index to its
+        problems
+    """
+    parsed = []
+    errors = {}
+    for ix, line in enumerate(lines):
+        if not isinstance(line, dict):
+            errors[ix] = {'line': 'Must be an object'}
+            continue
+        errs = {}
+        item = line.get('item')
+        if not item or not '{}'.format(item).isdigit():
+            errs['item'] = 'An item barcode is required'
+        amounts = {}
+        for fld in FIELDS:
+            if line.get(fld) in (None, ''):
+                continue
+            try:
+                amounts[fld] = Decimal('{}'.format(line[fld]))
+            except DecimalException:
+                errs[fld] = 'Must be a number'
+                continue
+            if not amounts[fld].is_finite():
+                errs[fld] = 'Must be a number'
+            elif amounts[fld] < 0:
+                errs[fld] = 'Must not be negative'
+        if errs:
+            errors[ix] = errs
+        else:
+            amounts['item'] = '{}'.format(item)
+            parsed.append(amounts)
+    return parsed, errors
+
+
+def combine(lines):
+    """
+    Folds lines for the same item together: the ``units`` and ``cost``
+    add up, and the last ``price`` stands.
+    """
+    combined = {}
+    for line in lines:
+        into = combined.setdefault(line['item'], {})
+        for fld, val in line.items():
+            if fld in ('units', 'cost') and fld in into:
+                into[fld] += val
+            elif fld != 'item':
+                into[fld] = val
+    return combined
+
+
+def receive(invoice_id, lines):
+    """
+    Applies received lines to an invoice, atomically.
+
+    :returns: ``(summary, errors)``; nothing is written if there are errors
+    """
+    lines, errors = parse_lines(lines)
+    if errors:
+        return None, {'lines': errors}
+    by_item = combine(lines)
+
+    with transaction.atomic():
+        # the invoice's row lock keeps two receipts of it from interleaving
+        invoice = Invoice.objects.select_for_update().filter(id=invoice_id).first()
+        if invoice is None:
+            return None, {'invoice': 'Invoice not found'}
+        known = set(ItemTemplate.objects.filter(identifier_id__in=list(by_item))
+                    .values_list('identifier_id', flat=True))
+        unknown = [bc for bc in by_item if bc not in known]
+        if unknown:
+            return None, {'items': 'Not found: {}'.format(', '.join(unknown))}
+
+        summary = {'invoice': invoice.id, 'items': len(by_item)}
+        units = {bc: line['units'] for bc, line in by_item.items() if 'units' in line}
+        summary['stock'] = add_stock(units)
+        # every line is a purchase, whether or not its cost is known yet
+        summary['purchases'] = add_costs(invoice, {bc: line.get('cost', 0)
+                                                   for bc, line in by_item.items()
+                                                   if 'cost' in line or 'units' in line},
+                                         units)
+        summary['prices'] = set_prices({bc: line['price'] for bc, line in by_item.items()
+                                        if 'price' in line})
+    return summary, {}
+
+
+def add_stock(units, batch_size=500):
+    """
+    Adds received units to the stock on hand.  Existing records are bumped
+    by UPDATEs of ``units + n``, one for each distinct ``n``, so no record
+    needs to be read first.
+
+    :returns: The number of StockBook records written
+    """
+    if not units:
+        return 0
+    now = timezone.now()
+    found = set(StockBook.objects.filter(itm_id__in=list(units))
+                .values_list('itm_id', flat=True))
+    by_delta = {}
+    for bc in found:
+        by_delta.setdefault(units[bc], []).append(bc)
+    for delta, barcodes in by_delta.items():
+        for ix in range(0, len(barcodes), batch_size):
+            StockBook.objects.filter(itm_id__in=barcodes[ix:ix + batch_size]).update(
+                units=Coalesce('units', Value(Decimal(0))) + delta,
+                updated=now)
+    StockBook.objects.bulk_create([StockBook(itm_id=bc, units=val) for bc, val in units.items()
+                                   if bc not in found], batch_size=batch_size)
+    return len(units)
+
+
+def add_costs(invoice, costs, units=None):
+    """
+    Adds to the cost, and optionally the units, of the invoice's purchases.
+
+    :param units: received units for some of the items in ``costs``
+    :returns: The number of Purchase records written
+    """
+    if not costs:
+        return 0
+    units = units or {}
+    added_cost = sum(costs.values())
+    added_units = sum(units.get(bc, 0) for bc in costs)
+    found = (Purchase.objects.select_for_update()
+             .filter(invoice=invoice, item_id__in=list(costs)))
+    changed = []
+    for pchs in found:
+        pchs.cost = (pchs.cost or 0) + costs.pop(pchs.item_id)
+        if pchs.item_id in units:
+            pchs.units = (pchs.units or 0) + units[pchs.item_id]
+        changed.append(pchs)
+    Purchase.objects.bulk_update(changed, ['cost', 'units'], batch_size=500)
+    Purchase.objects.bulk_create([Purchase(invoice=invoice, item_id=bc, cost=val,
+                                           units=units.get(bc)) for bc, val in costs.items()],
+                                 batch_size=500)
+    # bulk writes send no signals
+    add_to_invoice(invoice.id, len(costs), added_cost, added_units)
+    return len(changed) + len(costs)
+
+
+def set_prices(prices):
+    """:returns: The number of Price records written"""
+    if not prices:
+        return 0
+    now = timezone.now()
+    found = Price.objects.select_for_update().filter(itm_id__in=list(prices))
+    changed = []
+    for rcd in found:
+        if rcd.price != prices[rcd.itm_id]:
+            rcd.price = prices[rcd.itm_id]
+            rcd.updated = now
+            changed.append(rcd)
+        del prices[rcd.itm_id]
+    Price.objects.bulk_update(changed, ['price', 'updated'], batch_size=500)
+    Price.objects.bulk_create([Price(itm_id=bc, price=val) for bc, val in prices.items()],
+                              batch_size=500)
+    return len(changed) + len(prices)
+
+
+def upsert(queryset, changes, row):
+    """
+    Writes ``changes`` to the rows of ``queryset`` in one UPDATE, or inserts
+    ``row`` if there are none.  The insert is made in a savepoint; if
+    another writer inserted the row first, the UPDATE is made again.
+
+    :returns: ``True`` if ``row`` was inserted, ``False`` if rows were
+        updated, ``None`` if neither
+    """
+    if queryset.update(**changes):
+        return False
+    try:
+        with transaction.atomic():
+            row.save(force_insert=True)
+        return True
+    except IntegrityError:
+        return False if queryset.update(**changes) else None
+
+
+def set_units(item, units):
+    """
+    Sets an item's stock on hand; with no ``units``, just makes sure it has
+    a StockBook record.  The record is read first, so an unchanged one is
+    not written.
+
+    :returns: Whether the record was created or changed
+    """
+    stock = StockBook.objects.filter(itm=item)
+    current = stock.values('units').first()
+    if current is None:
+        return upsert(stock, {'units': units, 'updated': timezone.now()},
+                      StockBook(itm=item, units=units)) is not None
+    if units is None or current['units'] == units:
+        return False
+    return stock.update(units=units, updated=timezone.now()) > 0
+
+
+def add_cost(invoice, item, amount, units=None):
+    """
+    Adds to the cost, and optionally the units received, of an item's
+    purchase on an invoice, in the database, so that two stations receiving
+    the same item cannot lose either amount.
+
+    :returns: The Purchase ID
+    """
+    purchase = Purchase.objects.filter(invoice=invoice, item=item)
+    changes = {'cost': Coalesce('cost', Value(Decimal(0))) + amount}
+    if units:
+        changes['units'] = Coalesce('units', Value(Decimal(0))) + units
+    row = Purchase(invoice=invoice, item=item, cost=amount, units=units or None)
+    if upsert(purchase, changes, row):
+        return row.id   # its save updated the invoice's totals
+    add_to_invoice(invoice.id, cost=amount, units=units or 0)
+    return purchase.values_list('id', flat=True).first()
@@ -0,0 +1,242 @@
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Identifier, ItemTemplate, LinkedCode
+from .utils import check_digit
+
+ITEM_FIELDS = ['description', 'brand', 'content', 'part_unit', 'yardage', 'notes']
+
+# ``item`` holds the ITEM_FIELDS of the ItemTemplate, or None
+Scan = namedtuple('Scan', ['barcode', 'linked_code', 'kind', 'item'])
+
+
+class ScanCache(object):
+    """
+    A bounded LRU map of digit strings onto their ``Scan`` -- or onto
+    ``None``, so repeated unknown codes are not looked up again either.
+
+    Saves and deletes in this process clear it; entries also expire after
+    ``max_age`` seconds, which bounds how long a change made by another
+    process can go unseen.
+    """
+
+    def __init__(self, size=4096, max_age=30):
+        self.size = size
+        self.max_age = max_age
+        self.entries = OrderedDict()    # digitstring: (expires, scan)
+        self.generation = 0             # bumped by clear()
+        self.lock = threading.Lock()
+
+    def get(self, digitstring, load):
+        return self.get_many([digitstring], lambda keys: {ds: load(ds) for ds in keys})[digitstring]
+
+    def get_many(self, digitstrings, load_many):
+        """
+        :param load_many: called with the digit strings not in the cache;
+            returns a ``dict`` of their scans
+        :returns: A ``dict`` of the scan (or ``None``) for each digit string
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self.lock:
+            for ds in digitstrings:
+                entry = self.entries.get(ds)
+                if entry and entry[0] > now:
+                    self.entries.move_to_end(ds)
+                    found[ds] = entry[1]
+                elif ds not in found:
+                    missing.append(ds)
+            generation = self.generation
+        if not missing:
+            return found
+
+        loaded = load_many(missing)
+        found.update(loaded)
+        with self.lock:
+            if generation != self.generation:   # cleared while loading
+                return found
+            for ds, scan in loaded.items():
+                self.entries[ds] = (now + self.max_age, scan)
+                self.entries.move_to_end(ds)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return found
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+
+scan_cache = ScanCache()
+
+
+class KnownCodes(object):
+    """
+    A Bloom filter over every barcode and linked code, so that scans of
+    codes never issued or linked here are turned away without a query.
+
+    It may say yes to an unknown code (about ``error_rate`` of them), but
+    never no to a code it has seen.  Codes added by other processes are
+    covered two ways: new linked codes are read every ``refresh`` seconds
+    (by their creation time), and any code with a good Damm check digit --
+    every barcode we issue -- is let through to the database regardless.
+    The filter is rebuilt from scratch every ``max_age`` seconds, which
+    drops deleted codes, and whenever it fills past its capacity.
+    """
+
+    def __init__(self, error_rate=0.01, refresh=10, max_age=3600, slack=timedelta(minutes=1)):
+        self.error_rate = error_rate
+        self.refresh = refresh
+        self.max_age = max_age
+        self.slack = slack      # allows for clock skew between servers
+        self.bits = None        # built on first use
+        self.lock = threading.Lock()
+
+    def build(self):
+        codes = list(Identifier.idents.values_list('barcode', flat=True))
+        codes += LinkedCode.objects.values_list('code', flat=True)
+        capacity = max(1024, 2 * len(codes))
+        # the optimal sizes for ``capacity`` codes at ``error_rate``
+        size = int(-capacity * math.log(self.error_rate) / math.log(2) ** 2)
+        self.size = size
+        self.hashes = max(1, round(size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((size + 7) // 8)
+        now = time.monotonic()
+        self.built = self.checked = now
+        self.since = timezone.now()
+        for code in codes:
+            self.add(code)
+
+    def positions(self, code):
+        # double hashing over the halves of one 64-bit hash; ``hash()`` of a
+        # str varies between processes, which does not matter in memory
+        h = hash(code) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + ix * h2) % self.size for ix in range(self.hashes)]
+
+    def add(self, code):
+        if self.bits is None:
+            return      # the build will read it
+        for pos in self.positions(code):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, code):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(code))
+
+    def current(self):
+        """Builds, rebuilds or brings the filter up to date, as needed."""
+        now = time.monotonic()
+        if self.bits is not None and now - self.checked < self.refresh:
+            return
+        with self.lock:
+            if self.bits is None or now - self.built > self.max_age or \
+                    self.count > self.capacity:
+                self.build()
+            elif now - self.checked >= self.refresh:
+                since, self.since = self.since, timezone.now()
+                for code in LinkedCode.objects.filter(created__gte=since - self.slack) \
+                                              .values_list('code', flat=True):
+                    self.add(code)
+                self.checked = now
+
+    def may_exist(self, digitstring):
+        """
+        :returns: ``False`` if no identifier can match ``digitstring``
+        """
+        self.current()
+        return digitstring in self or check_digit(digitstring) == 0
+
+    def reset(self):
+        with self.lock:
+            self.bits = None
+
+
+known_codes = KnownCodes()
+
+
+def lookup(digitstring):
+    """
+    Reads an identifier matching either its barcode or one of its linked
+    codes, with its item, in one query.  A barcode match wins.
+    """
+    return lookup_many([digitstring])[digitstring]
+
+
+def lookup_many(digitstrings, chunk_size=400):
+    """
+    ``lookup`` for many digit strings, with one query per ``chunk_size``:
+    a UNION of a primary-key lookup and a lookup on the unique linked-code
+    index.
+
+    :returns: A ``dict`` of the ``Scan`` (or ``None``) for each digit string
+    """
+    columns = ['barcode', 'linked_code', 'kind'] + ['itemtemplate__' + f for f in ITEM_FIELDS]
+    digitstrings = list(dict.fromkeys(digitstrings))
+    found = dict.fromkeys(digitstrings)
+    for ix in range(0, len(digitstrings), chunk_size):
+        chunk = digitstrings[ix:ix + chunk_size]
+        by_barcode = (Identifier.idents.filter(barcode__in=chunk).order_by()
+                      .values_list('barcode', 'itemtemplate__identifier', *columns))
+        by_code = (LinkedCode.objects.filter(code__in=chunk).order_by()
+                   .values_list('code', 'identifier__itemtemplate__identifier',
+                                *['identifier__' + col for col in columns]))
+        for row in by_barcode.union(by_code, all=True):
+            code = row[0]
+            if found[code] is not None and found[code].barcode == code:
+                continue    # already matched as a barcode
+            item = dict(zip(ITEM_FIELDS, row[5:])) if row[1] is not None else None
+            found[code] = Scan(row[2], row[3], row[4], item)
+    return found
+
+
+def resolve(digitstring):
+    """
+    :returns: The ``Scan`` for a barcode or linked code, or ``None``
+    """
+    if not known_codes.may_exist(digitstring):
+        return None
+    return scan_cache.get(digitstring, lookup)
+
+
+def resolve_many(digitstrings):
+    """
+    :returns: A ``dict`` of the ``Scan`` (or ``None``) for each digit string
+    """
+    found = dict.fromkeys(digitstrings)
+    wanted = [ds for ds in found if known_codes.may_exist(ds)]
+    if wanted:
+        found.update(scan_cache.get_many(wanted, lookup_many))
+    return found
+
+
+@receiver(post_save, sender=Identifier, dispatch_uid='inventory.scans.ident_saved')
+@receiver(post_delete, sender=Identifier, dispatch_uid='inventory.scans.ident_deleted')
+@receiver(post_save, sender=LinkedCode, dispatch_uid='inventory.scans.code_saved')
+@receiver(post_delete, sender=LinkedCode, dispatch_uid='inventory.scans.code_deleted')
+@receiver(post_save, sender=ItemTemplate, dispatch_uid='inventory.scans.item_saved')
+@receiver(post_delete, sender=ItemTemplate, dispatch_uid='inventory.scans.item_deleted')
+def clear_scans(sender, **kwargs):
+    scan_cache.clear()
+
+
+@receiver(post_save, sender=Identifier, dispatch_uid='inventory.scans.ident_known')
+def learn_barcode(sender, instance, **kwargs):
+    known_codes.add(instance.barcode)
+
+
+@receiver(post_save, sender=LinkedCode, dispatch_uid='inventory.scans.code_known')
+def learn_code(sender, instance, **kwargs):
+    known_codes.add(instance.code)
@@ -0,0 +1,119 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import ItemTemplate, ItemTerm
+
+# searchable fields, and how much a match in each one counts
+WEIGHTS = [
+    ('description', 4),
+    ('brand', 3),
+    ('content', 2),
+    ('notes', 1),
+]
+MIN_PREFIX = 3      # shorter query words must match a whole term
+TERM_LEN = ItemTerm._meta.get_field('term').max_length
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    :returns: The lower-cased words of ``text``, in order
+    """
+    if not text:
+        return []
+    return [word[:TERM_LEN] for word in WORD_RE.findall(text.lower())]
+
+
+def item_terms(item):
+    """
+    :returns: ``{term: weight}`` for one item; a word found in several
+        fields keeps its best weight
+    """
+    terms = {}
+    for fld, weight in WEIGHTS:
+        for word in tokenize(getattr(item, fld)):
+            terms[word] = max(weight, terms.get(word, 0))
+    return terms
+
+
+def index_item(item):
+    """
+    Brings the index rows for one item up to date, touching only the terms
+    that changed.
+    """
+    terms = item_terms(item)
+    with transaction.atomic():
+        current = dict(ItemTerm.objects.filter(item=item).values_list('term', 'weight'))
+        stale = [t for t, w in current.items() if terms.get(t) != w]
+        if stale:
+            ItemTerm.objects.filter(item=item, term__in=stale).delete()
+        ItemTerm.objects.bulk_create([ItemTerm(term=t, item=item, weight=w)
+                                      for t, w in terms.items() if current.get(t) != w])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuilds the whole index, e.g. after a bulk ``update()`` that bypassed
+    the ``post_save`` signal.
+
+    :returns: The number of items indexed
+    """
+    fields = ['identifier_id'] + [fld for fld, weight in WEIGHTS]
+    count = 0
+    with transaction.atomic():
+        ItemTerm.objects.all().delete()
+        batch = []
+        for item in ItemTemplate.objects.only(*fields).iterator():
+            count += 1
+            batch.extend(ItemTerm(term=t, item_id=item.pk, weight=w)
+                         for t, w in item_terms(item).items())
+            if len(batch) >= batch_size:
+                ItemTerm.objects.bulk_create(batch)
+                batch = []
+        ItemTerm.objects.bulk_create(batch)
+    return count
+
+
+def word_match(word):
+    if len(word) < MIN_PREFIX:
+        return Q(term=word)
+    return Q(term__startswith=word)
+
+
+def rank(query, limit):
+    """
+    Finds the items that match every word of ``query``, each word matching
+    the start of some indexed term ("bat" finds "batik").  Only index rows
+    for those words are read.
+
+    Items are ranked by the weights of the terms they matched, whole-word
+    matches counting double.
+
+    :returns: A ``list`` of ``(item pk, score)``, best first
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+    found = {'w{}'.format(ix): Max(Case(When(word_match(word), then=1), default=0,
+                                        output_field=IntegerField()))
+             for ix, word in enumerate(words)}
+    exact = Case(When(term__in=words, then=F('weight')), default=0,
+                 output_field=IntegerField())
+    qs = (ItemTerm.objects.filter(reduce(or_, map(word_match, words)))
+          .values('item_id')
+          .annotate(score=Sum('weight') + Sum(exact), **found)
+          .filter(**{nm: 1 for nm in found})
+          .order_by('-score', 'item_id'))
+    return list(qs.values_list('item_id', 'score')[:limit])
+
+
+@receiver(post_save, sender=ItemTemplate, dispatch_uid='inventory.search.index_item')
+def item_saved(sender, instance, raw=False, **kwargs):
+    if not raw:     # fixtures are indexed with rebuild_index
+        index_item(instance)
@@ -36,6 +36,7 @@ app.itemTemplateView = Backbone.View.extend({
     },
     detailValidations: {
         units: { name: 'pattern', args: [], message: 'Enter a number' },
+        received: { name: 'pattern', args: [], message: 'Enter a number' },
         cost: { name: 'range', args: [0, 999999.99], message: 'Cost Range is 0.00 to 999999.99' },
         price: { name: 'range', args: [0, 999999.99], message: 'Price Range is 0.00 to 999999.99' }
     },
@@ -70,6 +71,7 @@ app.itemTemplateView = Backbone.View.extend({
         const ydg = this.model.get('yardage')==true;
         const pattern = (ydg)? /^(?:\d{1,3})\.?(?:\d{0,3})?$/: /^(?:\d{1,3})$/;
         this.detailValidations['units']['args'] = pattern;
+        this.detailValidations['received']['args'] = pattern;
         data = parent.querySelectorAll('input');
         let changes = Backbone.Validation.checkForm(this.detailValidations, data, this.model);
         //  show errors
@@ -98,58 +100,32 @@ app.itemTemplateView = Backbone.View.extend({
         return changes;
     },
     detailsResponse: function (m, r, o) {
-        if (o.source === 'stock') {
-            m.fetchCount = m.fetchCount + 1;
-            const ydg = this.model.get('yardage')==true;
-            let nu = ('errors' in r) ? null : r.units;
-            if (nu && !ydg) {
-                nu = Math.floor(nu);
-            }
-            this.model.set('units', nu);
-        }
-        if (o.source === 'price') {
-            m.fetchCount = m.fetchCount + 2;
-            this.model.set('price', ('errors' in r) ? null : r.price);
-        }
-        if (o.source === 'purchase') {
-            m.fetchCount = m.fetchCount + 3;
-            // will not return errors
-            let cost = null;
-            if (r.count > 0) {
-                cost = r.objects[r.count - 1].cost;
-            }
-            this.model.set('cost', cost);
+        //  stock, price and the most recent purchase, in one response
+        const found = !('errors' in r);
+        const ydg = this.model.get('yardage')==true;
+        let nu = found ? r.units : null;
+        if (nu && !ydg) {
+            nu = Math.floor(nu);
         }
-        //  after all three fetches have completed,
-        //  call renderDetails
-        if (m.fetchCount === 6) {
-            m.fetchCount = 0;
-            this.renderDetails();
-            }
+        this.model.set('units', nu);
+        this.model.set('price', found ? r.price : null);
+        this.model.set('cost', found ? r.cost : null);
+        this.model.set('received', null);
+        this.renderDetails();
     },
     eraseForm: function () {
         this.$el.html(' ');
     },
     fetchDetails: function () {
-        app.detailsRecord.fetchCount = 0;
         const bc = this.model.get('barcode');
-        //  fetch units, item_type from StockBook
+        //  fetch units, item_type, price and cost
         const opts = {
-            url: '/inventory/api/stock/' + bc,
+            url: '/inventory/api/itemdetails/' + bc,
             success: this.detailsResponse,
             error: this.detailsResponse,
-            source: 'stock',
             wait: true
             };
         app.detailsRecord.fetch(opts);
-        //  fetch price from Price
-        opts.url = '/inventory/api/price/' + bc;
-        opts.source = 'price';
-        app.detailsRecord.fetch(opts);
-        //  fetch cost from Purchase ( most recent invoice )
-        opts.url = '/inventory/api/purchase?item=' + bc;
-        opts.source = 'purchase';
-        app.detailsRecord.fetch(opts);
     },
     renderDetails: function () {
         if (this.detailTemplate === null) {
@@ -0,0 +1,85 @@
+"""
+Running totals for each invoice -- its number of purchase lines, their
+cost and their units -- kept on the Invoice row, so that listings need
+not add up Purchase rows.
+
+Saving or deleting a Purchase adjusts them through the signals here.  The
+bulk writers in receiving.py send no signals, and call ``add_to_invoice``
+themselves.  Every change is an increment made in the database, so
+concurrent writers cannot lose one another's.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Invoice, Purchase
+
+
+def add_to_invoice(invoice_id, lines=0, cost=0, units=0):
+    """Adds to an invoice's totals; negative amounts take away."""
+    changes = {}
+    if lines:
+        changes['lines'] = F('lines') + lines
+    if cost:
+        changes['total_cost'] = F('total_cost') + cost
+    if units:
+        changes['total_units'] = F('total_units') + units
+    if changes:
+        Invoice.objects.filter(id=invoice_id).update(**changes)
+
+
+def refresh(invoices=None):
+    """
+    Recomputes the totals from the Purchase rows, in one UPDATE -- for
+    invoices from before the totals were kept, or after a bulk change.
+
+    :param invoices: a queryset of invoices; all of them by default
+    :returns: The number of invoices updated
+    """
+    if invoices is None:
+        invoices = Invoice.objects.all()
+    purchases = Purchase.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+
+    def total(aggregate, field):
+        return Coalesce(Subquery(purchases.annotate(total=aggregate).values('total'),
+                                 output_field=field), 0)
+
+    return invoices.update(
+        lines=total(Count('id'), IntegerField()),
+        total_cost=total(Sum('cost'), DecimalField(max_digits=12, decimal_places=2)),
+        total_units=total(Sum('units'), DecimalField(max_digits=12, decimal_places=3)))
+
+
+def summarized(purchase):
+    # from the instance's __dict__, so deferred fields are not loaded
+    values = purchase.__dict__
+    return (values.get('invoice_id'), Decimal('{}'.format(values.get('cost') or 0)),
+            Decimal('{}'.format(values.get('units') or 0)))
+
+
+@receiver(post_init, sender=Purchase, dispatch_uid='inventory.summaries.purchase_loaded')
+def purchase_loaded(sender, instance, **kwargs):
+    instance._summarized = summarized(instance) if instance.pk else (None, 0, 0)
+
+
+@receiver(post_save, sender=Purchase, dispatch_uid='inventory.summaries.purchase_saved')
+def purchase_saved(sender, instance, created, **kwargs):
+    was_invoice, was_cost, was_units = getattr(instance, '_summarized', (None, 0, 0))
+    invoice_id, cost, units = summarized(instance)
+    if created or was_invoice != invoice_id:
+        if was_invoice is not None and not created:
+            add_to_invoice(was_invoice, -1, -was_cost, -was_units)
+        add_to_invoice(invoice_id, 1, cost, units)
+    else:
+        add_to_invoice(invoice_id, 0, cost - was_cost, units - was_units)
+    instance._summarized = (invoice_id, cost, units)
+
+
+@receiver(post_delete, sender=Purchase, dispatch_uid='inventory.summaries.purchase_deleted')
+def purchase_deleted(sender, instance, **kwargs):
+    was_invoice, was_cost, was_units = getattr(instance, '_summarized', summarized(instance))
+    if was_invoice is not None:
+        add_to_invoice(was_invoice, -1, -was_cost, -was_units)
@@ -1,31 +1,22 @@
 import copy
 import json
-import sys
 
-from io import StringIO
-from contextlib import contextmanager
 from datetime import date, timedelta
 from decimal import Decimal
 from tempfile import TemporaryDirectory
+from unittest import mock
 
+from django.db import connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from accounts.models import User
-from ..apis import BaseResource
-from ..models import Identifier, Location, Supplier, ItemTemplate, Picture
-from ..models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale
-
-
-@contextmanager
-def capture(command, *args, **kwargs):
-    out, sys.stdout = sys.stdout, StringIO()
-    try:
-        command(*args, **kwargs)
-        sys.stdout.seek(0)
-        yield sys.stdout.read()
-    finally:
-        sys.stdout = out
+from ..apis import BaseResource, IdentResource, ItemTemplateResource
+from ..models import Identifier, LinkedCode, Location, Supplier, ItemTemplate, Picture
+from ..models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale, PrintJob
+from ..scans import scan_cache
 
 
 class BaseResourceTest(TestCase):
@@ -63,67 +54,67 @@ class BaseResourceTest(TestCase):
         self.assertIn('linked_code', rv, "should have 'linked_code' field")
         self.assertNotIn('not_a', rv, "should not have 'not_a' field")
 
-    def test_filter_record(self):
-
-        p = {'barcode': ('CharField', '1000015')}
-        r = Identifier(barcode='1000015')
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
-
-        p = {'uploaded': ('DateField', 'ge:2000-01-01')}
-        r = Picture(uploaded=date.today())
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
-
-        p = {'uploaded': ('DateField', 'bt:2000-01-01,2099-12-31')}
-        r = Picture(uploaded=date.today())
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
+    def test_filter_queryset(self):
 
-        p = {'price': ('DecimalField', 'le:29.99')}
-        r = Price(price=Decimal(7.95))
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
-
-        p = {'price': ('DecimalField', 'bt:4.95,29.99')}
-        r = Price(price=Decimal(7.95))
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
+        Identifier.idents.create(barcode='1000015')
+        Picture.objects.create(photo='tin_man.jpg')
+        item = ItemTemplate.objects.create(description='Emerald City',
+                                           identifier=Identifier.idents.create(
+                                               barcode='1000002'))
+        Price.objects.create(itm=item, price=Decimal('7.95'))
+        Receipt.objects.create(count=3)
+        Receipt.objects.create(count=5)
+
+        cases = [
+            (Identifier.idents, {'barcode': ('CharField', '1000015')}, 1),
+            (Picture.objects, {'uploaded': ('DateField', 'ge:2000-01-01')}, 1),
+            (Picture.objects, {'uploaded': ('DateField', 'bt:2000-01-01,2099-12-31')}, 1),
+            (Picture.objects, {'item': ('ForeignKey', 'None')}, 1),
+            (Price.objects, {'price': ('DecimalField', 'le:29.99')}, 1),
+            (Price.objects, {'price': ('DecimalField', 'bt:4.95,29.99')}, 1),
+            (Price.objects, {'price': ('DecimalField', 'bt:7.95,29.99')}, 0),
+            (Receipt.objects, {'count': ('IntegerField', 'lt:5')}, 1),
+            (Receipt.objects, {'count': ('IntegerField', 'bt:1,9')}, 2),
+        ]
+        for manager, p, count in cases:
+            rv = manager.filter(**self.br.build_lookups(p))
+            self.assertEqual(rv.count(), count, "{} should match {}".format(p, count))
+
+    def test_build_lookups(self):
+
+        p = {'name': ('CharField', 'basket')}
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'name__icontains': 'basket'})
 
         p = {'item': ('ForeignKey', 'None')}
-        r = Picture()
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
-
-        p = {'count': ('IntegerField', 'lt:5')}
-        r = Receipt(count=3)
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
-
-        p = {'count': ('IntegerField', 'bt:1,9')}
-        r = Receipt(count=5)
-        rv = self.br.filter_record(p, r)
-        self.assertTrue(rv, "should be True")
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'item__isnull': True})
 
-    def test_compare_values(self):
+        p = {'loc': ('ForeignKey', '1007')}
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'loc': '1007'})
 
-        rv = self.br.compare_values("or", 1, 2)
-        self.assertFalse(rv, "'or' is not a comparator")
-
-        rv = self.br.compare_values("lt", 5, 25)
-        self.assertTrue(rv, "5 is less than 25")
+        p = {'uploaded': ('DateField', 'bt:2000-01-01,2099-12-31')}
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'uploaded__gt': date(2000, 1, 1),
+                              'uploaded__lt': date(2099, 12, 31)})
 
-        rv = self.br.compare_values("le", 15, 15)
-        self.assertTrue(rv, "15 is less-or-equal 15")
+        p = {'price': ('DecimalField', 'le:29.99')}
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'price__lte': Decimal('29.99')})
 
-        rv = self.br.compare_values("gt", 25, 10)
-        self.assertTrue(rv, "25 is greater than 10")
+        p = {'count': ('PositiveSmallIntegerField', 'eq:2')}
+        rv = self.br.build_lookups(p)
+        self.assertEqual(rv, {'count__exact': 2})
 
-        rv = self.br.compare_values("ge", 15, 15)
-        self.assertTrue(rv, "15 is greater-or-equal 15")
+        p = {'count': ('PositiveSmallIntegerField', 'or:2')}
+        rv = self.br.build_lookups(p)
+        self.assertIsNone(rv, "'or' is not a comparator")
 
-        rv = self.br.compare_values("bt", 2, 1, 3)
-        self.assertTrue(rv, "2 is greater than 1 and less than 3")
+        p = {'created': ('DateTimeField', 'gt:2026-01-01')}
+        rv = self.br.build_lookups(p)
+        self.assertIn('created__gte', rv, "should start at the next midnight")
+        self.assertEqual(rv['created__gte'].date(), date(2026, 1, 2))
 
 
 class IdentResourceTest(TestCase):
@@ -132,9 +123,12 @@ class IdentResourceTest(TestCase):
     def setUpTestData(cls):
         Identifier.idents.create(barcode='1007')
         Identifier.idents.create(barcode='1010')
-        Identifier.idents.create(barcode='1000002', linked_code='0006151620418')
+        LinkedCode.link(Identifier.idents.create(barcode='1000002'), '0006151620418')
         Identifier.idents.create(barcode='1000015')
 
+    def setUp(self):
+        scan_cache.clear()     # rolled-back rows send no signals
+
     def test_auth(self):
         digitstring = ' '
         url = reverse('ident-detail', kwargs={'digitstring': digitstring})
@@ -180,6 +174,57 @@ class IdentResourceTest(TestCase):
         self.assertIn('type', d, "type field missing")
         self.assertEqual(d['type'], "ITM", "Wrong typecode")
 
+        response = self.client.get('{}?fields=type'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d, {'type': 'ITM'}, "should return only the type")
+
+    def test_list(self):
+        url = reverse('ident-list')
+        response = self.client.get('{}?prefix=10'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        self.assertEqual([(each['type'], each['identifier']) for each in d['objects']],
+                         [('LOC', '1007'), ('LOC', '1010'), ('ITM', '1000002'), ('ITM', '1000015')],
+                         "should group locations before items")
+
+        response = self.client.get('{}?prefix=000615'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['objects'], [{'identifier': '1000002', 'linked_code': '0006151620418',
+                                         'type': 'ITM'}], "should match linked codes")
+
+        response = self.client.get('{}?prefix=1009'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 0, "should find nothing")
+
+        response = self.client.get('{}?prefix=10&limit=1'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 1)
+
+        response = self.client.get('{}?prefix=1a'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject non-digits")
+
+    def test_scan_batch(self):
+        url = reverse('ident-list')
+        scans = ['1000015', '0006151620418', '999', '1007', '4-A', '1000015']
+        with self.assertNumQueries(1):
+            response = self.client.post(url, scans, content_type="application/json")
+        self.assertEqual(response.status_code, 200, "should return the results")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], len(scans))
+        self.assertEqual([(each['identifier'], each['type']) for each in d['objects'][:4]],
+                         [('1000015', 'ITM'), ('1000002', 'ITM'), ('', 'OTHER'), ('1007', 'LOC')],
+                         "should answer in input order")
+        self.assertIn('digitstring', d['objects'][4]['errors'])
+        self.assertEqual(d['objects'][5]['identifier'], '1000015')
+
+        response = self.client.post(url, {'scans': scans}, content_type="application/json")
+        d = json.loads(response.content)
+        self.assertIn('digitstrings', d['errors'], "should want a list")
+        with mock.patch.object(IdentResource, 'max_scans', 2):
+            response = self.client.post(url, scans, content_type="application/json")
+        d = json.loads(response.content)
+        self.assertIn('digitstrings', d['errors'], "should limit the batch size")
+
 
 class LocIdResourceTest(TestCase):
 
@@ -224,6 +269,46 @@ class LocIdResourceTest(TestCase):
                                     content_type="application/json")
         self.assertEqual(response.status_code, 201, "should return 'Created'")
 
+    def test_create_batch(self):
+        url = reverse('locid-list')
+        self.client.login(username='dorothy', password='rubySlippers')
+        response = self.client.post(url, {'count': 3}, content_type="application/json")
+        self.assertEqual(response.status_code, 201, "should return 'Created'")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 3)
+        self.assertEqual([each['barcode'] for each in d['objects']], ['1010', '1029', '1032'])
+        self.assertEqual(Identifier.locIDs.count(), 4, "should be stored as LocIDs")
+
+        for count in [0, 'ten', Identifier.idents.count() + 10000]:
+            response = self.client.post(url, {'count': count}, content_type="application/json")
+            d = json.loads(response.content)
+            self.assertIn('count', d['errors'], "should reject count {}".format(count))
+
+        url = reverse('itemid-list')
+        response = self.client.post(url, {'count': 2}, content_type="application/json")
+        d = json.loads(response.content)
+        self.assertEqual([each['barcode'] for each in d['objects']], ['1000015', '1000028'])
+        response = self.client.post(url, content_type="application/json")
+        self.assertEqual(response.status_code, 201, "should return 'Created'")
+        self.assertEqual(json.loads(response.content)['barcode'], '1000031')
+        self.assertEqual(Identifier.itemIDs.count(), 4)
+
+    def test_create_past_the_last(self):
+        url = reverse('locid-list')
+        self.client.login(username='dorothy', password='rubySlippers')
+        Identifier.idents.create(barcode='9953')    # 995 of 100-999
+        response = self.client.post(url, {'count': 1000}, content_type="application/json")
+        d = json.loads(response.content)
+        self.assertEqual(d['errors'], {'count': 'Only 4 left'})
+        response = self.client.post(url, {'count': 4}, content_type="application/json")
+        self.assertEqual(json.loads(response.content)['count'], 4,
+                         "the failed request should reserve nothing")
+
+        response = self.client.post(url, content_type="application/json")
+        self.assertEqual(json.loads(response.content)['errors'], {'count': 'Only 0 left'})
+        self.assertFalse(Identifier.idents.filter(kind=Identifier.Kind.OTHER).exists(),
+                         "no 5-digit IDs should be made")
+
 
 class LocationResourceTest(TestCase):
 
@@ -324,14 +409,21 @@ class LocationResourceTest(TestCase):
         change = json.dumps({'printed': True})
         url = reverse('location-detail', kwargs={'pk': pk})
 
-        def test_patch(url, change):
-            response = self.client.patch(url, change)
-            self.assertEqual(response.status_code, 200, "should return 'OK'")
+        response = self.client.patch(url, change)
+        self.assertEqual(response.status_code, 202, "should return 'Accepted'")
+        d = json.loads(response.content)
+        self.assertEqual(d['barcode'], '1010')
+        self.assertEqual(d['format'], 'zpl')
+        self.assertEqual(d['status'], 'PEND')
 
-        with capture(test_patch, url, change) as output:
-            self.assertEqual(output,
-                             'Printing barcode label for Location "Basket 1"\n',
-                             "Expected dummy print statement")
+        response = self.client.patch(url, change)
+        d2 = json.loads(response.content)
+        self.assertEqual(d2['id'], d['id'], "a pending label should not be queued twice")
+        self.assertEqual(d2['requests'], 2)
+
+        response = self.client.patch(url, json.dumps({'format': 'png'}))
+        d = json.loads(response.content)
+        self.assertIn('format', d['errors'])
 
 
 class SupplierResourceTest(TestCase):
@@ -458,6 +550,84 @@ class ItemTemplateResourceTest(TestCase):
         self.assertEqual(d['count'], 1, "should return one record")
         self.assertEqual(d['objects'][0]['barcode'], '1000002', "should return 'Emerald City'")
 
+    def test_list_pages(self):
+
+        url = reverse('item-list')
+        response = self.client.get('{}?limit=2'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a page")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 2, "should return two records")
+        self.assertEqual([o['barcode'] for o in d['objects']], ['1000002', '1000015'])
+        self.assertIsNotNone(d['next'], "should have a next-cursor")
+
+        response = self.client.get('{}?limit=2&after={}'.format(url, d['next']))
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 1, "should return the last record")
+        self.assertEqual(d['objects'][0]['barcode'], '1000028')
+        self.assertIsNone(d['next'], "should be the last page")
+
+        response = self.client.get('{}?limit=2'.format(url))
+        d = json.loads(response.content)
+        wqs = '{}?description=field&limit=1&after={}'.format(url, d['next'])
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 1, "filters should still apply")
+
+        response = self.client.get('{}?limit=none'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject the limit")
+        response = self.client.get('{}?limit=2&after=bogus'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject the cursor")
+
+        response = self.client.get(url)
+        d = json.loads(response.content)
+        self.assertNotIn('next', d, "unpaginated lists should be unchanged")
+
+    def test_list_fields(self):
+
+        url = reverse('item-list')
+        wqs = '{}?fields=barcode,description'.format(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(wqs)
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 3, "should return every record")
+        for each in d['objects']:
+            self.assertEqual(set(each), {'barcode', 'description'})
+        self.assertEqual(len(ctx.captured_queries), 1, "should be a single query")
+        self.assertNotIn('inventory_identifier', ctx.captured_queries[0]['sql'],
+                         "should not join the identifier table")
+
+        url = reverse('item-detail', kwargs={'pk': 1000002})
+        response = self.client.get('{}?fields=itmID'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(list(d), ['itmID'], "detail should honor fields too")
+
+        response = self.client.get('{}?fields=itmID,label'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject unknown fields")
+
+    def test_list_stream(self):
+
+        url = reverse('item-list')
+        whole = self.client.get(url).content
+        with mock.patch.object(ItemTemplateResource, 'stream_chunk_size', 2):
+            response = self.client.get('{}?stream=1'.format(url))
+            self.assertTrue(response.streaming, "should stream the response")
+            self.assertEqual(b''.join(response.streaming_content), whole,
+                             "streamed body should match the plain one")
+
+            wqs = '{}?stream=1&description=zzz'.format(url)
+            response = self.client.get(wqs)
+            d = json.loads(b''.join(response.streaming_content))
+            self.assertEqual(d, {'objects': [], 'count': 0})
+
+            response = self.client.get('{}?stream=1&limit=2'.format(url))
+            d = json.loads(b''.join(response.streaming_content))
+            self.assertEqual(d['count'], 2, "should stream one page")
+            self.assertIsNotNone(d['next'], "should have a next-cursor")
+
+        response = self.client.get('{}?stream=1&limit=x'.format(url))
+        self.assertEqual(response.status_code, 400, "should fail before streaming")
+
     def test_detail(self):
 
         pk = 1000002
@@ -504,6 +674,20 @@ class ItemTemplateResourceTest(TestCase):
         response = self.client.post(url, item, content_type="application/json")
         self.assertEqual(response.status_code, 201, "should return 'Created'")
 
+    def test_update_linked_codes(self):
+        scan_cache.clear()
+        url = reverse('item-detail', kwargs={'pk': 1000002})
+        self.client.login(username='dorothy', password='rubySlippers')
+        for upc in ['0006151620418', '0735732014051']:
+            response = self.client.put(url, json.dumps({'linked_code': upc}))
+            self.assertEqual(response.status_code, 202, "should return 'Accepted'")
+            self.assertEqual(json.loads(response.content)['linked_code'], upc)
+
+        for upc in ['0006151620418', '0735732014051']:
+            response = self.client.get(reverse('ident-detail', kwargs={'digitstring': upc}))
+            d = json.loads(response.content)
+            self.assertEqual(d['identifier'], '1000002', "every code should still resolve")
+
     def test_update(self):
 
         pk = 1000002
@@ -555,14 +739,14 @@ class ItemTemplateResourceTest(TestCase):
         change = json.dumps({'printed': True})
         url = reverse('item-detail', kwargs={'pk': pk})
 
-        def test_patch(url, change):
-            response = self.client.patch(url, change)
-            self.assertEqual(response.status_code, 200, "should return 'OK'")
-
-        with capture(test_patch, url, change) as output:
-            self.assertEqual(output,
-                             'Printing barcode label for Item "Yellow Brick Road"\n',
-                             "Expected dummy print statement")
+        change = json.dumps({'format': 'pdf', 'template': 'large'})
+        response = self.client.patch(url, change)
+        self.assertEqual(response.status_code, 202, "should return 'Accepted'")
+        d = json.loads(response.content)
+        self.assertEqual(d['barcode'], '1000015')
+        self.assertEqual(d['format'], 'pdf')
+        self.assertEqual(d['template'], 'large')
+        self.assertEqual(d['status'], 'PEND')
 
 
 class ItemDataResourceTest(TestCase):
@@ -584,6 +768,9 @@ class ItemDataResourceTest(TestCase):
         ItemTemplate.objects.create(description='Emerald City',
                                     identifier=cls.item)
 
+    def setUp(self):
+        scan_cache.clear()     # rolled-back rows send no signals
+
     def test_detail(self):
 
         url = reverse('itemdata-detail', kwargs={'digitstring': 'trial'})
@@ -669,11 +856,17 @@ class ItemDataResourceTest(TestCase):
         d = json.loads(response.content)
         self.assertIn('purchase', d, "Purchase tag missing")
 
-        response = self.client.post(url, {'item': self.barcode,
+        response = self.client.post(url, {'item': self.barcode, 'units': '15',
+                                          'received': '4',
                                           'cost': '2.99', 'invoice': self.invc},
                                     content_type="application/json")
         d = json.loads(response.content)
         self.assertIn('purchase', d, "Purchase tag missing")
+        invoice = Invoice.objects.get(id=self.invc)
+        self.assertEqual((invoice.total_cost, invoice.total_units),
+                         (Decimal('5.98'), Decimal(4)),
+                         "should add the units received, not the stock on hand")
+        self.assertEqual(StockBook.objects.get(itm_id=self.barcode).units, 15)
 
         response = self.client.post(url, {'item': self.barcode,
                                           'price': '7.99'},
@@ -688,6 +881,99 @@ class ItemDataResourceTest(TestCase):
         self.assertIn('price', d, "Price tag missing")
 
 
+class ItemDetailsResourceTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = Supplier.objects.create(name='My supplier')
+        shelf = Location.objects.create(name='Basket 1',
+                                        identifier=Identifier.idents.create(barcode='1010'))
+        cls.item = ItemTemplate.objects.create(description='Emerald City', yardage=True,
+                                               identifier=Identifier.idents.create(
+                                                   barcode='1000002'))
+        ItemTemplate.objects.create(description='Yellow Brick Road', yardage=False,
+                                    identifier=Identifier.idents.create(barcode='1000015'))
+        StockBook.objects.create(itm=cls.item, loc=shelf, units=Decimal('2.5'))
+        Price.objects.create(itm=cls.item, price=Decimal('12.50'))
+        old = Invoice.objects.create(vendor=vendor)
+        Invoice.objects.filter(id=old.id).update(received=timezone.now() - timedelta(days=30))
+        cls.invc = Invoice.objects.create(vendor=vendor)
+        cls.pchs = Purchase.objects.create(invoice=cls.invc, item=cls.item, cost=Decimal('9.10'))
+        Purchase.objects.create(invoice=old, item=cls.item, cost=Decimal('8.00'))
+
+    def test_detail(self):
+        url = reverse('itemdetails-detail', kwargs={'pk': 1000022})
+        response = self.client.get(url)
+        d = json.loads(response.content)
+        self.assertEqual(d['errors']['item'], "Item not found")
+
+        url = reverse('itemdetails-detail', kwargs={'pk': 1000002})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        d = json.loads(response.content)
+        self.assertEqual(d['item'], '1000002')
+        self.assertEqual(d['itm_type'], 1)
+        self.assertEqual(Decimal(d['units']), Decimal('2.5'))
+        self.assertEqual(d['loc'], '1010')
+        self.assertEqual(d['price'], '12.50')
+        self.assertEqual(d['cost'], '9.10', "the most recent invoice's cost")
+        self.assertEqual(d['purchase']['id'], self.pchs.id)
+        self.assertEqual(d['purchase']['invoice'], self.invc.id)
+
+    def test_detail_empty(self):
+        url = reverse('itemdetails-detail', kwargs={'pk': 1000015})
+        d = json.loads(self.client.get(url).content)
+        self.assertEqual(d['itm_type'], 0)
+        for fld in ['units', 'loc', 'price', 'cost', 'purchase']:
+            self.assertIsNone(d[fld], "{} should be empty".format(fld))
+
+
+class ReceivingResourceTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usr = User.objects.create_user(username='dorothy',
+                                           email='dot@kansas.gov',
+                                           is_active=True,
+                                           is_superuser=True,
+                                           password='rubySlippers')
+        vendor = Supplier.objects.create(name='My supplier')
+        cls.invc = Invoice.objects.create(vendor=vendor)
+        ItemTemplate.objects.create(description='Emerald City',
+                                    identifier=Identifier.idents.create(barcode='1000002'))
+
+    def test_create(self):
+        url = reverse('receiving-list')
+        change = {'invoice': self.invc.id,
+                  'lines': [{'item': '1000002', 'units': 3, 'cost': '9.10', 'price': '12.50'}]}
+        response = self.client.post(url, json.dumps(change), content_type='application/json')
+        self.assertEqual(response.status_code, 401, "should need a login")
+
+        self.client.force_login(self.usr)
+        response = self.client.post(url, json.dumps(change), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        d = json.loads(response.content)
+        self.assertEqual(d, {'invoice': self.invc.id, 'items': 1,
+                             'stock': 1, 'purchases': 1, 'prices': 1})
+        pchs = Purchase.objects.get(item_id='1000002')
+        self.assertEqual((pchs.cost, pchs.units), (Decimal('9.10'), Decimal(3)))
+        self.invc.refresh_from_db()
+        self.assertEqual((self.invc.lines, self.invc.total_cost, self.invc.total_units),
+                         (1, Decimal('9.10'), Decimal(3)), "should keep the invoice totals")
+
+        response = self.client.post(url, json.dumps({'lines': []}),
+                                    content_type='application/json')
+        d = json.loads(response.content)
+        self.assertEqual(d['errors'], {'invoice': 'No invoice ID',
+                                       'lines': 'A list of lines is required'})
+
+        change['lines'][0]['units'] = 'three'
+        response = self.client.post(url, json.dumps(change), content_type='application/json')
+        d = json.loads(response.content)
+        self.assertEqual(d['errors'], {'lines': {'0': {'units': 'Must be a number'}}})
+
+
 class PictureResourceTest(TestCase):
 
     @classmethod
@@ -901,6 +1187,55 @@ class StockBookResourceTest(TestCase):
         self.assertEqual(d['count'], 1, "should return one record")
         self.assertEqual(d['objects'][0]['loc'], self.locID, "should return location")
 
+    def test_list_ordering(self):
+        i3 = ItemTemplate.objects.get(identifier_id=self.itm3)
+        StockBook.objects.create(itm=i3)
+        base = timezone.now().replace(microsecond=500)
+        for ix, itm in enumerate([self.itmID, self.itm2, self.itm3]):
+            # less than a millisecond apart
+            StockBook.objects.filter(itm_id=itm).update(
+                updated=base + timedelta(microseconds=100 * ix))
+        url = reverse('stock-list')
+
+        for order, expected in [('updated', [self.itmID, self.itm2, self.itm3]),
+                                ('-updated', [self.itm3, self.itm2, self.itmID])]:
+            seen = []
+            wqs = '{0}?ordering={1}&limit=1'.format(url, order)
+            while wqs and len(seen) < 5:
+                d = json.loads(self.client.get(wqs).content)
+                seen.extend(each['itm'] for each in d['objects'])
+                nxt = d.get('next')
+                wqs = '{0}?ordering={1}&limit=1&after={2}'.format(url, order, nxt) if nxt else None
+            self.assertEqual(seen, expected, "cursors should keep the microseconds")
+
+    def test_list_include(self):
+
+        url = reverse('stock-list')
+        with self.assertNumQueries(1):
+            response = self.client.get('{}?include=itm,loc'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 2, "should return both records")
+        first = d['objects'][0]
+        self.assertEqual(first['itm']['barcode'], self.itmID, "should embed the item")
+        self.assertEqual(first['itm']['description'], 'Bolt of Fabric')
+        self.assertEqual(first['loc']['name'], 'here', "should embed the location")
+        self.assertEqual(first['itm_type'], 1, "should keep the other fields")
+
+        wqs = '{}?include=loc&fields=itm,loc&loc={}'.format(url, self.locID2)
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual(d['objects'][0]['itm'], self.itm2, "itm should stay a key")
+        self.assertEqual(d['objects'][0]['loc']['barcode'], self.locID2)
+
+        url = reverse('stock-detail', kwargs={'pk': self.itmID})
+        response = self.client.get('{}?include=loc'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['loc']['name'], 'here', "detail should embed too")
+
+        response = self.client.get('{}?include=price'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject unknown relations")
+
     def test_create(self):
         url = reverse('stock-list')
         response = self.client.post(url, {'item': 'record'},
@@ -1057,6 +1392,36 @@ class PriceResourceTest(TestCase):
         self.assertIn('objects', d, "objects container missing")
         self.assertEqual(d['count'], 1, "should return one record")
 
+    def test_list_ordering(self):
+        i3 = ItemTemplate.objects.get(identifier_id=self.itm3)
+        Price.objects.create(itm=i3, price=None)
+        url = reverse('price-list')
+
+        response = self.client.get('{0}?ordering=-price'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        prices = [each['price'] for each in d['objects']]
+        self.assertEqual(prices[:2], ['24.99', '7.99'], "should be sorted high to low")
+        expected = [each['itm'] for each in d['objects']]
+
+        seen = []
+        wqs = '{0}?ordering=-price&limit=1'.format(url)
+        while wqs:
+            response = self.client.get(wqs)
+            self.assertEqual(response.status_code, 200, "should return a page")
+            d = json.loads(response.content)
+            seen.extend(each['itm'] for each in d['objects'])
+            nxt = d.get('next')
+            wqs = '{0}?ordering=-price&limit=1&after={1}'.format(url, nxt) if nxt else None
+        self.assertEqual(seen, expected, "pages should follow the same order")
+
+        response = self.client.get('{0}?ordering=-price&limit=1&after={1}'.format(
+                                   url, BaseResource().encode_cursor(['pk'], [1])))
+        self.assertEqual(response.status_code, 400, "cursor is for another order")
+
+        response = self.client.get('{0}?ordering=cost'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject unknown fields")
+
     def test_create(self):
         url = reverse('price-list')
         response = self.client.post(url, {'item': 'record'},
@@ -1141,6 +1506,10 @@ class InvoiceResourceTest(TestCase):
         inv102 = Invoice.objects.create(id=102, vendor=cls.sup1)
         inv103 = Invoice.objects.create(id=103, vendor=cls.sup2)
         inv104 = Invoice.objects.create(id=104, vendor=cls.sup2)
+        itm = ItemTemplate.objects.create(description='Emerald City',
+                                          identifier=Identifier.idents.create(
+                                              barcode='1000002'))
+        Purchase.objects.create(invoice=inv101, item=itm, cost=Decimal('4.50'))
         return
 
     def test_detail(self):
@@ -1161,6 +1530,8 @@ class InvoiceResourceTest(TestCase):
         self.assertIn('id', d, "id field missing")
         self.assertIn('vendor', d, "vendor field missing")
         self.assertEqual(d['id'], 101)
+        self.assertEqual(d['lines'], 1, "should count the purchases")
+        self.assertEqual(d['total_cost'], '4.50')
 
     def test_list(self):
 
@@ -1180,6 +1551,12 @@ class InvoiceResourceTest(TestCase):
         self.assertEqual(d['count'], 2, "should return two records")
         self.assertEqual(d['objects'][0]['vendor'], self.sup1.id, "should return vendor")
 
+        wqs = '{0}?total_cost=gt:0'.format(url)
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual([each['id'] for each in d['objects']], [101],
+                         "should filter on the totals")
+
     def test_create(self):
 
         url = reverse('invoice-list')
@@ -1363,6 +1740,40 @@ class PurchaseResourceTest(TestCase):
         return
 
 
+class PrintJobResourceTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Identifier.idents.create(barcode='1010')
+        cls.j1 = PrintJob.objects.create(identifier_id='1010')
+        cls.j2 = PrintJob.objects.create(identifier_id='1010', format='pdf',
+                                         status=PrintJob.Status.DONE)
+
+    def test_detail(self):
+        url = reverse('printjob-detail', kwargs={'pk': 5})
+        response = self.client.get(url)
+        d = json.loads(response.content)
+        self.assertEqual(d['errors']['id'], "Print job #5 not found")
+
+        url = reverse('printjob-detail', kwargs={'pk': self.j2.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, "should return a job")
+        d = json.loads(response.content)
+        self.assertEqual(d['barcode'], '1010')
+        self.assertEqual(d['format'], 'pdf')
+        self.assertEqual(d['status'], 'DONE')
+
+    def test_list(self):
+        url = reverse('printjob-list')
+        response = self.client.get(url, {'status': 'PEND'})
+        d = json.loads(response.content)
+        self.assertEqual([job['id'] for job in d['objects']], [self.j1.id])
+
+        response = self.client.post(url, json.dumps({'identifier_id': '1010'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401, "jobs come from print_label")
+
+
 class ReceiptResourceTest(TestCase):
 
     @classmethod
@@ -1507,6 +1918,22 @@ class ItemSaleResourceTest(TestCase):
         self.assertEqual(d['objects'][0]['id'], self.tran01.id, "should return record 1")
         self.assertEqual(d['objects'][0]['count'], self.tran01.count, "should return count")
 
+        now = timezone.localdate()
+        wqs = '{0}?created=ge:{1}'.format(url, now.strftime("%Y-%m-%d"))
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 2, "should return today's records")
+
+        wqs = '{0}?created=gt:{1}'.format(url, now.strftime("%Y-%m-%d"))
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 0, "should return empty list")
+
+        wqs = '{0}?count=or:1'.format(url)
+        response = self.client.get(wqs)
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 0, "should return empty list")
+
     def test_create(self):
         url = reverse('itemsale-list')
         response = self.client.post(url, {}, content_type="application/json")
@@ -0,0 +1,151 @@
+import re
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from .. import labels
+from ..barcodes import (CODE128_PATTERNS, bars, code128, code128_values, ean13, ean13_digits,
+                        ean_check_digit, runs)
+from ..models import Identifier, ItemTemplate, Location, Price, StockBook
+
+
+def decode128(widths):
+    """Reads the symbol values back out of a Code 128 encoding."""
+    patterns = {p: val for val, p in enumerate(CODE128_PATTERNS)}
+    text = ''.join(str(w) for w in widths)
+    return [patterns[text[ix:ix + 6]] for ix in range(0, len(text) - 7, 6)] + [
+            patterns[text[-7:]]]
+
+
+class BarcodeTest(TestCase):
+
+    def test_code128(self):
+        self.assertEqual(code128_values('1000002'), [105, 10, 0, 0, 100, 18, 90, 106])
+        self.assertEqual(decode128(code128('1000002')), code128_values('1000002'))
+        self.assertEqual(sum(code128('1000002')), 90, "11 modules a symbol, 13 for the stop")
+        self.assertEqual(code128_values('A')[:2], [104, 33], "text is in code set B")
+        with self.assertRaises(ValueError):
+            code128('')
+
+    def test_ean13(self):
+        self.assertEqual(ean_check_digit('400638133393'), 1)
+        widths = ean13('4006381333931')
+        self.assertEqual(sum(widths), 95)
+        for bad in ['4006381333932', '400638133393', '036000291453']:
+            with self.assertRaises(ValueError):
+                ean13(bad)
+
+    def test_upc_a(self):
+        # UPC-A 036000291452: guards, six left digits in L codes, the centre
+        # guard, six right digits in R codes
+        left = ['0001101', '0111101', '0101111', '0001101', '0001101', '0001101']
+        right = ['1101100', '1110100', '1100110', '1011100', '1001110', '1101100']
+        modules = '101' + ''.join(left) + '01010' + ''.join(right) + '101'
+        self.assertEqual(ean13('036000291452'), runs(modules))
+        self.assertEqual(ean13('036000291452'), ean13('0036000291452'),
+                         "a UPC-A is an EAN-13 with a leading zero")
+        self.assertEqual(ean13_digits('036000291452'), '0036000291452')
+
+    def test_bars(self):
+        self.assertEqual(bars((2, 1, 1, 3, 1)), [(0, 2), (3, 1), (7, 1)])
+
+
+class LabelTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usr = User.objects.create_user(username='dorothy',
+                                           email='dot@kansas.gov',
+                                           is_active=True,
+                                           password='rubySlippers')
+        shelf = Location.objects.create(name='Shelf (A)',
+                                        identifier=Identifier.idents.create(barcode='1010'))
+        item = ItemTemplate.objects.create(description='Yellow Brick Road',
+                                           identifier=Identifier.idents.create(
+                                               barcode='1000015',
+                                               linked_code='4006381333931'))
+        Price.objects.create(itm=item, price=Decimal('12.50'))
+        StockBook.objects.create(itm=item, loc=shelf)
+        Identifier.idents.create(barcode='1000028')
+
+    def test_label_data(self):
+        with self.assertNumQueries(2):
+            found = labels.label_data(['1000028', '1000015', '1010'])
+        self.assertEqual([lbl.barcode for lbl in found], ['1000028', '1000015', '1010'])
+        self.assertEqual(found[0].title, None, "an unattached identifier has only its barcode")
+        self.assertEqual(found[1].title, 'Yellow Brick Road')
+        self.assertEqual(found[1].price, Decimal('12.50'))
+        self.assertEqual(found[1].location, 'Shelf (A)')
+        self.assertEqual(found[2].location, 'Shelf (A)')
+        self.assertEqual(labels.default_template(found[2]).name, 'shelf')
+
+    def test_render_svg(self):
+        content, content_type = labels.render(['1000015', '1010'], 'svg')
+        self.assertEqual(content_type, 'image/svg+xml')
+        self.assertTrue(content.startswith(b'<svg '))
+        self.assertIn(b'Yellow Brick Road', content)
+        self.assertIn(b'$12.50', content)
+        self.assertIn(b'height="144pt"', content, "two labels, one above the other")
+
+    def test_render_pdf(self):
+        content, content_type = labels.render(['1000015', '1010'], 'pdf')
+        self.assertEqual(content_type, 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF-1.4'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Count 2', content, "one label a page")
+        self.assertIn(b'(Shelf \\(A\\))', content, "parentheses are escaped")
+
+        # the xref table points at each object
+        xref = int(re.search(rb'startxref\n(\d+)', content).group(1))
+        offsets = re.findall(rb'(\d{10}) 00000 n', content[xref:])
+        for num, off in enumerate(offsets, 1):
+            self.assertTrue(content[int(off):].startswith(b'%d 0 obj' % num))
+
+    def test_render_sheet(self):
+        barcodes = ['1000015'] * 31
+        content, content_type = labels.render(barcodes, 'pdf', sheet='letter-30')
+        self.assertIn(b'/Count 2', content, "31 labels need two sheets of 30")
+        self.assertIn(b'/MediaBox [0 0 612 792]', content)
+
+    def test_render_zpl(self):
+        content, content_type = labels.render(['1000015', '1010'], 'zpl', sheet='letter-30')
+        self.assertEqual(content.count(b'^XA'), 2, "no sheets on a roll")
+        self.assertIn(b'^BCN,85,N,N,N^FD1000015^FS', content)
+
+        content, content_type = labels.render(['1000015'], 'zpl', template='item-ean')
+        self.assertIn(b'^BEN,85,N,N^FD400638133393^FS', content)
+
+        Identifier.idents.filter(barcode='1000015').update(linked_code='036000291452')
+        content, content_type = labels.render(['1000015'], 'zpl', template='item-ean')
+        self.assertIn(b'^BEN,85,N,N^FD003600029145^FS', content, "UPC-A is zero-padded")
+
+    def test_render_errors(self):
+        for kwargs in [{'fmt': 'png'}, {'template': 'tiny'}, {'sheet': 'a4-99'}]:
+            with self.assertRaises(ValueError):
+                labels.render(['1010'], **kwargs)
+
+    def test_barcode_cache(self):
+        labels.rendered_barcode.cache_clear()
+        labels.render(['1000015'] * 10, 'svg')
+        info = labels.rendered_barcode.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 9)
+
+    def test_labels_view(self):
+        url = reverse('labels')
+        response = self.client.get(url, {'barcodes': '1010'})
+        self.assertEqual(response.status_code, 302, "should need logging in")
+
+        self.client.force_login(self.usr)
+        response = self.client.get(url, {'barcodes': '1010,1000015', 'sheet': 'letter-30'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        response = self.client.get(url, {'barcodes': '1010', 'format': 'svg'})
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+
+        for params in [{}, {'barcodes': '10x0'}, {'barcodes': '1010', 'format': 'png'}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
@@ -1,5 +1,10 @@
-from django.test import TestCase
+from io import StringIO
 
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+
+from ..models import BlockAllocator, LinkedCode, Sequence
 from ..models import Identifier, Location, Supplier, ItemTemplate, Picture
 from ..models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale
 
@@ -31,6 +36,121 @@ class IdentifierTest(TestCase):
         self.assertEqual(result, '1000015')
 
 
+class IdentifierKindTest(TestCase):
+
+    def test_kind(self):
+        for barcode, kind in [('1007', 'LOC'), ('1000002', 'ITM'), ('999', 'OTHER'),
+                              ('12ab', 'OTHER')]:
+            ident = Identifier.idents.create(barcode=barcode)
+            self.assertEqual(ident.kind, kind, "wrong kind for {}".format(barcode))
+        self.assertEqual(list(Identifier.locIDs.values_list('barcode', flat=True)), ['1007'])
+        self.assertEqual(list(Identifier.itemIDs.values_list('barcode', flat=True)), ['1000002'])
+
+    def test_backfill(self):
+        for barcode in ['1007', '1000002', '999']:
+            Identifier.idents.create(barcode=barcode)
+        Identifier.idents.update(kind=Identifier.Kind.LOC)   # as if never set
+
+        out = StringIO()
+        call_command('backfill_identifier_kind', stdout=out)
+        kinds = dict(Identifier.idents.values_list('barcode', 'kind'))
+        self.assertEqual(kinds, {'1007': 'LOC', '1000002': 'ITM', '999': 'OTHER'})
+        self.assertIn('ITM: 1 updated', out.getvalue())
+
+
+class LinkedCodeTest(TestCase):
+
+    def test_codes(self):
+        ident = Identifier.idents.create(barcode='1000002')
+        LinkedCode.link(ident, '0006151620418')
+        LinkedCode.link(ident, '0735732014051')
+        self.assertEqual(set(ident.linked_codes.values_list('code', flat=True)),
+                         {'0006151620418', '0735732014051'}, "old codes should be kept")
+        other = Identifier.idents.create(barcode='1000015')
+        LinkedCode.link(other, '0006151620418')
+        self.assertEqual(LinkedCode.objects.get(code='0006151620418').identifier, other,
+                         "a code should move to its new identifier")
+        ident.refresh_from_db()
+        self.assertEqual(ident.linked_code, '0735732014051')
+        lbl = '{}'.format(LinkedCode.objects.get(code='0735732014051'))
+        self.assertEqual(lbl, '0735732014051 -> 1000002')
+
+        stale = Identifier.idents.get(barcode='1000002')
+        LinkedCode.link(other, '0735732014051')
+        ident.refresh_from_db()
+        self.assertIsNone(ident.linked_code, "should not show a code it lost")
+        self.assertEqual(Identifier.idents.get(barcode='1000015').linked_code, '0735732014051')
+
+        stale.save()
+        self.assertEqual(LinkedCode.objects.get(code='0735732014051').identifier_id, '1000015',
+                         "saving an identifier should not take a code back")
+
+    def test_backfill(self):
+        Identifier.idents.create(barcode='1000002', linked_code='0006151620418')
+        Identifier.idents.create(barcode='1000015')
+        LinkedCode.objects.all().delete()   # as if saved before the table existed
+
+        out = StringIO()
+        call_command('backfill_linked_codes', stdout=out)
+        self.assertIn('1 codes linked', out.getvalue())
+        self.assertEqual(LinkedCode.objects.get().identifier_id, '1000002')
+        call_command('backfill_linked_codes', stdout=out)
+        self.assertEqual(LinkedCode.objects.count(), 1)
+
+
+class SequenceTest(TestCase):
+
+    def test_reserve(self):
+        self.assertEqual(Sequence.reserve('test'), range(1, 2))
+        self.assertEqual(Sequence.reserve('test', 3), range(2, 5))
+        self.assertEqual(Sequence.reserve('seeded', 2, seed=lambda: 100), range(100, 102))
+        self.assertEqual(Sequence.reserve('seeded', seed=lambda: 1), range(102, 103),
+                         "seed is only used once")
+        self.assertEqual('{}'.format(Sequence.objects.get(name='test')), 'test @ 5')
+
+    def test_block_allocator_in_transaction(self):
+        alloc = BlockAllocator('test', block_size=10)
+        self.assertEqual([alloc.next() for ix in range(3)], [1, 2, 3])
+        self.assertEqual(Sequence.objects.get(name='test').next_value, 4,
+                         "a test runs in a transaction, so no block is kept")
+
+    def test_make_ids_follow_existing(self):
+        Identifier.idents.create(barcode='1052')
+        Identifier.idents.create(barcode='1000251')
+        self.assertEqual(Identifier.make_loc_id(), '1064')
+        self.assertEqual(Identifier.make_loc_id(), '1078', "should not repeat")
+        self.assertEqual(Identifier.make_item_id(), '1000263')
+
+    def test_make_ids_before_backfill(self):
+        Identifier.idents.create(barcode='1000002')
+        Identifier.idents.create(barcode='10000')
+        Identifier.idents.update(kind=Identifier.Kind.OTHER)  # as if saved before 'kind'
+        self.assertEqual(Identifier.make_item_id(), '1000015',
+                         "should follow existing IDs of any kind")
+        self.assertEqual(Identifier.make_loc_id(), '1007', "a 5-digit code is not a LOC ID")
+
+
+class BlockAllocatorTest(TransactionTestCase):
+
+    def test_blocks(self):
+        alloc = BlockAllocator('test', block_size=10)
+        self.assertEqual([alloc.next() for ix in range(12)], list(range(1, 13)))
+        self.assertEqual(Sequence.objects.get(name='test').next_value, 21,
+                         "should reserve a block at a time")
+        other = BlockAllocator('test', block_size=10)
+        self.assertEqual(other.next(), 21, "blocks never overlap")
+
+    def test_rolled_back(self):
+        alloc = BlockAllocator('test', block_size=10)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.assertEqual(alloc.next(), 1)
+                raise IntegrityError
+        self.assertEqual(alloc.block, range(0), "a block rolled back must not be kept")
+        other = BlockAllocator('test', block_size=10)
+        self.assertEqual([other.next(), alloc.next()], [1, 11])
+
+
 class LocationTest(TestCase):
 
     def test_name(self):
@@ -0,0 +1,121 @@
+import os
+from decimal import Decimal
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from ..models import (Identifier, Invoice, ItemTemplate, LinkedCode, Purchase, StockBook,
+                      Supplier)
+from ..packing import header_columns, import_packing_list, parse_row, read_rows
+
+PACKING_LIST = """SKU,Description,Qty,Unit Cost
+0006151620418,Emerald fat quarter,4,2.50
+1000015,Yellow Brick Road,2,$10.00
+0006151620418,Emerald fat quarter,1,2.50
+9999999999999,Not ours,3,1.00
+1010,A shelf,1,1.00
+1000015,Yellow Brick Road,two,10.00
+"""
+
+
+class PackingListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usr = User.objects.create_user(username='dorothy',
+                                           email='dot@kansas.gov',
+                                           is_active=True,
+                                           is_superuser=True,
+                                           password='rubySlippers')
+        cls.vendor = Supplier.objects.create(name='My supplier')
+        emerald = Identifier.idents.create(barcode='1000002')
+        LinkedCode.link(emerald, '0006151620418')
+        ItemTemplate.objects.create(description='Emerald City', identifier=emerald)
+        road = ItemTemplate.objects.create(description='Yellow Brick Road',
+                                           identifier=Identifier.idents.create(barcode='1000015'))
+        StockBook.objects.create(itm=road, units=Decimal('3'))
+        Identifier.idents.create(barcode='1010')
+
+    def test_read_rows(self):
+        rows = list(read_rows(['code\tqty\n', '\n', '1000015\t2\n']))
+        self.assertEqual(rows, [(1, ['code', 'qty']), (3, ['1000015', '2'])])
+        self.assertEqual(header_columns(rows[0][1]), {'code': 0, 'quantity': 1})
+        self.assertIsNone(header_columns(rows[1][1]))
+
+    def test_parse_row(self):
+        columns = {'code': 0, 'quantity': 1, 'cost': 2}
+        self.assertEqual(parse_row([' 1000015 ', '2', '$1.25'], columns),
+                         ('1000015', Decimal(2), Decimal('1.25')))
+        self.assertEqual(parse_row(['1000015', '2'], columns), ('1000015', Decimal(2), None))
+        for row in [['', '1'], ['1000015', '0'], ['1000015', 'x'], ['1000015', '1', '-1']]:
+            with self.assertRaises(ValueError):
+                parse_row(row, columns)
+
+    def test_import(self):
+        report = import_packing_list(StringIO(PACKING_LIST), Invoice(vendor=self.vendor),
+                                     chunk_size=2)
+        invoice = Invoice.objects.get(id=report['invoice'])
+        self.assertEqual(invoice.vendor, self.vendor)
+        self.assertEqual(report['lines'], 6)
+        self.assertEqual(report['matched'], 3)
+        self.assertEqual(report['unmatched'], 3)
+        self.assertEqual(report['units'], Decimal(7))
+        self.assertEqual(report['cost'], Decimal('32.50'))
+        self.assertEqual([(ln['line'], ln['reason']) for ln in report['unmatched_lines']],
+                         [(5, 'Unknown code'), (6, 'Not an item'),
+                          (7, 'Bad quantity or cost')])
+
+        self.assertEqual(StockBook.objects.get(itm_id='1000002').units, 5)
+        self.assertEqual(StockBook.objects.get(itm_id='1000015').units, 5, "units are added")
+        costs = dict(Purchase.objects.filter(invoice=invoice).values_list('item_id', 'cost'))
+        self.assertEqual(costs, {'1000002': Decimal('12.50'), '1000015': Decimal('20.00')})
+        self.assertEqual((invoice.lines, invoice.total_cost, invoice.total_units),
+                         (2, Decimal('32.50'), Decimal(7)))
+
+    def test_import_queries(self):
+        lines = ['1000015,1,1.00\n'] * 1000
+        invoice = Invoice.objects.create(vendor=self.vendor)
+        # savepoints and the invoice lock; for each chunk the lookup and the
+        # stock (2); then the purchases and the invoice's totals (3)
+        with self.assertNumQueries(3 + 2 * 3 + 3):
+            report = import_packing_list(lines, invoice, chunk_size=500)
+        self.assertEqual(report['matched'], 1000)
+        self.assertEqual(StockBook.objects.get(itm_id='1000015').units, 1003)
+
+    def test_command(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'packing.csv')
+            with open(path, 'w') as fh:
+                fh.write(PACKING_LIST)
+            out = StringIO()
+            call_command('import_packing_list', path, vendor=self.vendor.id, stdout=out)
+        self.assertIn("3 of 6 lines received, 3 unmatched", out.getvalue())
+        self.assertIn("line 5: '9999999999999' Unknown code", out.getvalue())
+
+    def test_upload(self):
+        url = reverse('packing-list-upload')
+        upload = SimpleUploadedFile('packing.csv', PACKING_LIST.encode())
+        response = self.client.post(url, {'vendor': self.vendor.id, 'file': upload})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.usr)
+        upload = SimpleUploadedFile('packing.csv', PACKING_LIST.encode())
+        response = self.client.post(url, {'vendor': self.vendor.id, 'file': upload})
+        d = response.json()
+        self.assertEqual(d['matched'], 3)
+        self.assertEqual(d['unmatched'], 3)
+
+        invoice = Invoice.objects.get(id=d['invoice'])
+        upload = SimpleUploadedFile('packing.tsv', b'1000015\t1\t10.00\n')
+        d = self.client.post(url, {'invoice': invoice.id, 'file': upload}).json()
+        self.assertEqual(d['invoice'], invoice.id)
+        self.assertEqual(Purchase.objects.get(invoice=invoice, item_id='1000015').cost,
+                         Decimal('30.00'))
+
+        response = self.client.post(url, {'vendor': self.vendor.id})
+        self.assertEqual(response.json()['error'], 'No file uploaded')
@@ -0,0 +1,90 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import apis
+from ..models import Identifier, Location, Supplier, ItemTemplate, Picture
+from ..models import StockBook, Price, Invoice, Purchase, Receipt, ItemSale
+from ..preparers import ReverseFormatter, ValuesPreparer
+
+
+class ReverseFormatterTest(TestCase):
+
+    def test_call(self):
+        fmt = ReverseFormatter('identifier-detail')
+        for pk in ['1007', 1000002]:
+            self.assertEqual(fmt(pk), reverse('identifier-detail', kwargs={'pk': pk}))
+
+
+class ValuesPreparerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        loc = Location.objects.create(name='Shelf A-1',
+                                      identifier=Identifier.idents.create(barcode='1007'))
+        i1 = ItemTemplate.objects.create(
+                    description='Bolt of Fabric',
+                    identifier=Identifier.idents.create(barcode='1000002',
+                                                        linked_code='0006151620418'))
+        i2 = ItemTemplate.objects.create(
+                    description='Inventoried Item', yardage=False,
+                    identifier=Identifier.idents.create(barcode='1000015'))
+        StockBook.objects.create(itm=i1, loc=loc, units=1.25)
+        StockBook.objects.create(itm=i2)
+        Picture.objects.create(photo='inventory/tests/data/small.bmp', item=i1)
+        Price.objects.create(itm=i1, price=7.99)
+        invoice = Invoice.objects.create(vendor=Supplier.objects.create(name='Milltown'))
+        Purchase.objects.create(invoice=invoice, item=i1, cost=12.50)
+        receipt = Receipt.objects.create(count=1, amount=7.99)
+        ItemSale.objects.create(receipt=receipt, item=i2, amount=3.99)
+
+    def test_lookup_column(self):
+        vp = ValuesPreparer(fields={})
+        self.assertEqual(vp.lookup_column(StockBook, 'loc_id'), 'loc_id')
+        self.assertEqual(vp.lookup_column(StockBook, 'itm.yardage'), 'itm__yardage')
+        self.assertEqual(vp.lookup_column(ItemTemplate, 'identifier.linked_code'),
+                         'identifier__linked_code')
+        self.assertEqual(vp.lookup_column(Picture, 'photo.name'), 'photo')
+        self.assertIsNone(vp.lookup_column(StockBook, 'itm'), "objects need instances")
+        self.assertIsNone(vp.lookup_column(StockBook, 'itm.type_item'), "methods are computed")
+        self.assertIsNone(vp.lookup_column(StockBook, 'not_a'))
+
+    def test_fallback(self):
+        vp = ValuesPreparer(fields={'itm_type': 'itm.type_item'})
+        self.assertIsNone(vp.compile(StockBook), "should not compile a method")
+
+    def test_matches_fields_preparer(self):
+        listings = {
+            apis.LocIdResource: Identifier.locIDs.all(),
+            apis.LocationResource: Location.objects.all(),
+            apis.SupplierResource: Supplier.objects.all(),
+            apis.ItemTemplateResource: ItemTemplate.objects.all(),
+            apis.PictureResource: Picture.objects.all(),
+            apis.StockBookResource: StockBook.objects.all(),
+            apis.PriceResource: Price.objects.all(),
+            apis.InvoiceResource: Invoice.objects.all(),
+            apis.PurchaseResource: Purchase.objects.all(),
+            apis.ReceiptResource: Receipt.objects.all(),
+            apis.ItemSaleResource: ItemSale.objects.all(),
+        }
+        for rsc, qs in listings.items():
+            preparer = rsc.preparer
+            plan = preparer.compile(qs.model)
+            self.assertIsNotNone(plan, "{} should compile".format(rsc.__name__))
+            columns, build = plan
+            fast = [build(row) for row in qs.values_list(*columns)]
+            slow = [preparer.prepare(obj) for obj in qs]
+            self.assertEqual(fast, slow, "{} output differs".format(rsc.__name__))
+
+    def test_expand(self):
+        rsc = apis.StockBookResource
+        preparer = rsc.preparer.expand({nm: (nm, p) for nm, p in rsc.includes.items()})
+        self.assertIs(preparer, rsc.preparer.expand(
+                      {nm: (nm, p) for nm, p in rsc.includes.items()}),
+                      "expansions should be reused")
+        qs = StockBook.objects.order_by('itm_id')
+        columns, build = preparer.compile(StockBook)
+        fast = [build(row) for row in qs.values_list(*columns)]
+        slow = [preparer.prepare(obj) for obj in qs]
+        self.assertEqual(fast, slow, "expanded output differs")
+        self.assertEqual(fast[0]['loc']['name'], 'Shelf A-1')
+        self.assertIsNone(fast[1]['loc'], "a null key should stay null")
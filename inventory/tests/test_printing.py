@@ -0,0 +1,95 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import printing
+from ..models import Identifier, ItemTemplate, Location, PrintJob
+
+
+class PrintQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Location.objects.create(name='Basket 1',
+                                identifier=Identifier.idents.create(barcode='1010'))
+        ItemTemplate.objects.create(description='Yellow Brick Road',
+                                    identifier=Identifier.idents.create(barcode='1000015'))
+
+    def test_enqueue(self):
+        with self.assertNumQueries(5):  # savepoint, the lock, no pending job, insert, release
+            job = printing.enqueue('1010')
+        self.assertEqual(job.format, 'zpl', "LABEL_FORMAT is the default")
+        self.assertEqual(printing.enqueue('1010').id, job.id, "should coalesce")
+        self.assertNotEqual(printing.enqueue('1010', 'pdf').id, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.requests, 2)
+
+        PrintJob.objects.filter(id=job.id).update(status=PrintJob.Status.DONE)
+        self.assertNotEqual(printing.enqueue('1010').id, job.id,
+                            "a printed label may be queued again")
+        with self.assertRaises(ValueError):
+            printing.enqueue('1010', 'png')
+
+    def test_claim(self):
+        jobs = [printing.enqueue(bc) for bc in ['1010', '1000015']]
+        claimed = printing.claim('one', limit=1)
+        self.assertEqual([job.id for job in claimed], [jobs[0].id])
+        self.assertEqual(claimed[0].status, PrintJob.Status.PRINTING)
+        self.assertEqual([job.id for job in printing.claim('two')], [jobs[1].id])
+        self.assertEqual(printing.claim('three'), [])
+
+        PrintJob.objects.update(updated=timezone.now() - timedelta(hours=1))
+        self.assertEqual(printing.requeue_stale(), 2)
+
+    def test_spool_directory(self):
+        for bc in ['1010', '1000015']:
+            printing.enqueue(bc)
+        with TemporaryDirectory() as spool:
+            printed = printing.run(spool, once=True)
+            self.assertEqual(printed, 2)
+            files = os.listdir(spool)
+            self.assertEqual(len(files), 1, "one file a batch")
+            with open(os.path.join(spool, files[0]), 'rb') as fh:
+                content = fh.read()
+        self.assertEqual(content.count(b'^XA'), 2)
+        self.assertEqual(PrintJob.objects.filter(status=PrintJob.Status.DONE).count(), 2)
+
+    def test_spool_device(self):
+        printing.enqueue('1010')
+        printing.enqueue('1000015', 'svg')
+        with TemporaryDirectory() as tmp:
+            device = os.path.join(tmp, 'lp0')
+            open(device, 'wb').close()
+            with override_settings(LABEL_PRINTER=device):
+                out = StringIO()
+                call_command('print_spooler', once=True, stdout=out)
+            with open(device, 'rb') as fh:
+                content = fh.read()
+        self.assertIn('Printed 2 labels', out.getvalue())
+        self.assertTrue(content.startswith(b'^XA'))
+        self.assertIn(b'<svg', content)
+        self.assertEqual(set(PrintJob.objects.values_list('output', flat=True)), {device})
+
+    def test_spool_failure(self):
+        job = printing.enqueue('1010')
+        with TemporaryDirectory() as tmp:
+            blocked = os.path.join(tmp, 'missing', 'lp0')
+            open(os.path.join(tmp, 'missing'), 'w').close()     # a file, not a directory
+            printing.run(blocked, once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PrintJob.Status.FAILED)
+        self.assertTrue(job.error)
+
+    def test_spool_error(self):
+        job = printing.enqueue('1010')
+        with mock.patch.object(printing.labels, 'render', side_effect=KeyError('title')):
+            self.assertEqual(printing.run('/nowhere', once=True), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PrintJob.Status.FAILED, "should not stay PRINTING")
+        self.assertEqual(job.error, "'title'")
@@ -0,0 +1,125 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from ..models import Identifier, Invoice, ItemTemplate, Price, Purchase, StockBook, Supplier
+from ..receiving import add_cost, combine, parse_lines, receive, set_units, upsert
+
+
+class ReceivingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = Supplier.objects.create(name='My supplier')
+        cls.invoice = Invoice.objects.create(vendor=vendor)
+        barcodes = Identifier.make_item_ids(200)
+        ItemTemplate.objects.bulk_create([ItemTemplate(identifier_id=bc,
+                                                       description='Fabric {}'.format(bc))
+                                          for bc in barcodes])
+        cls.barcodes = barcodes
+        first = barcodes[0]
+        StockBook.objects.create(itm_id=first, units=Decimal('1'))
+        Price.objects.create(itm_id=first, price=Decimal('3.00'))
+        Purchase.objects.create(invoice=cls.invoice, item_id=first, cost=Decimal('1.50'))
+
+    def test_parse_lines(self):
+        lines, errors = parse_lines([{'item': '1000002', 'units': 2, 'cost': '1.25'},
+                                     {'item': 'abc'}, 'junk',
+                                     {'item': 1000015, 'cost': 'lots', 'price': -1},
+                                     {'item': '1000028', 'units': 'NaN'}])
+        self.assertEqual(lines, [{'item': '1000002', 'units': Decimal(2),
+                                  'cost': Decimal('1.25')}])
+        self.assertEqual(errors[1], {'item': 'An item barcode is required'})
+        self.assertEqual(errors[2], {'line': 'Must be an object'})
+        self.assertEqual(errors[3], {'cost': 'Must be a number', 'price': 'Must not be negative'})
+        self.assertEqual(errors[4], {'units': 'Must be a number'})
+
+    def test_combine(self):
+        lines = [{'item': '1', 'units': Decimal(2), 'cost': Decimal(1), 'price': Decimal(4)},
+                 {'item': '1', 'units': Decimal(5), 'cost': Decimal(2), 'price': Decimal(5)}]
+        self.assertEqual(combine(lines), {'1': {'units': Decimal(7), 'cost': Decimal(3),
+                                                'price': Decimal(5)}})
+
+    def test_receive(self):
+        lines = [{'item': bc, 'units': 4, 'cost': '2.25', 'price': '5.00'}
+                 for bc in self.barcodes]
+        with self.assertNumQueries(14):     # savepoints, locks, reads, bulk writes and totals
+            summary, errs = receive(self.invoice.id, lines)
+        self.assertEqual(errs, {})
+        self.assertEqual(summary, {'invoice': self.invoice.id, 'items': 200,
+                                   'stock': 200, 'purchases': 200, 'prices': 200})
+
+        first = self.barcodes[0]
+        self.assertEqual(StockBook.objects.get(itm_id=first).units, 5, "units add to the stock")
+        pchs = Purchase.objects.get(item_id=first)
+        self.assertEqual((pchs.cost, pchs.units), (Decimal('3.75'), Decimal(4)),
+                         "cost and units add to the purchase")
+        self.assertEqual(Price.objects.get(itm_id=first).price, Decimal('5.00'))
+        self.assertEqual(StockBook.objects.filter(units=4).count(), 199)
+
+        summary, errs = receive(self.invoice.id, lines[:1])
+        self.assertEqual(summary['stock'], 1)
+        self.assertEqual(summary['prices'], 0, "unchanged prices are not written")
+
+    def test_receive_same_item(self):
+        second = self.barcodes[1]
+        StockBook.objects.create(itm_id=second, units=Decimal(10))
+        receive(self.invoice.id, [{'item': second, 'units': 2, 'cost': '1.00'},
+                                  {'item': second, 'units': 5, 'cost': '2.00'}])
+        self.assertEqual(StockBook.objects.get(itm_id=second).units, 17,
+                         "both lines add to the stock on hand")
+        pchs = Purchase.objects.get(item_id=second)
+        self.assertEqual((pchs.cost, pchs.units), (Decimal('3.00'), Decimal(7)))
+
+    def test_receive_errors(self):
+        line = {'item': self.barcodes[1], 'units': 4}
+        summary, errs = receive(999, [line])
+        self.assertEqual(errs, {'invoice': 'Invoice not found'})
+
+        summary, errs = receive(self.invoice.id, [line, {'item': '1000022', 'units': 1}])
+        self.assertEqual(errs, {'items': 'Not found: 1000022'})
+        self.assertFalse(StockBook.objects.filter(itm_id=self.barcodes[1]).exists(),
+                         "nothing should be written")
+
+
+class UpsertTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = Supplier.objects.create(name='My supplier')
+        cls.invoice = Invoice.objects.create(vendor=vendor)
+        cls.item = ItemTemplate.objects.create(description='Emerald City',
+                                               identifier=Identifier.idents.create(
+                                                   barcode='1000002'))
+
+    def test_add_cost(self):
+        with self.assertNumQueries(5):  # no rows to update; savepoint, insert, totals, release
+            pchs_id = add_cost(self.invoice, self.item, Decimal('2.99'))
+        with self.assertNumQueries(3):  # the update, the totals, the ID; nothing read first
+            self.assertEqual(add_cost(self.invoice, self.item, Decimal('2.99')), pchs_id)
+        self.assertEqual(Purchase.objects.get(id=pchs_id).cost, Decimal('5.98'))
+
+        Purchase.objects.filter(id=pchs_id).update(cost=None)
+        add_cost(self.invoice, self.item, Decimal('1.00'))
+        self.assertEqual(Purchase.objects.get(id=pchs_id).cost, Decimal('1.00'))
+
+    def test_set_units(self):
+        self.assertTrue(set_units(self.item, None), "should create the record")
+        self.assertFalse(set_units(self.item, None))
+        self.assertTrue(set_units(self.item, Decimal(2)))
+        with self.assertNumQueries(1):
+            self.assertFalse(set_units(self.item, Decimal(2)), "unchanged")
+        with self.assertNumQueries(1):
+            self.assertFalse(set_units(self.item, None))
+        self.assertEqual(StockBook.objects.get(itm=self.item).units, 2)
+
+    def test_upsert_race(self):
+        # another writer inserts the row between the UPDATE and the INSERT
+        queryset = mock.Mock()
+        queryset.update.side_effect = [0, 1]
+        row = mock.Mock()
+        row.save.side_effect = IntegrityError
+        self.assertIs(upsert(queryset, {'units': 1}, row), False)
+        self.assertEqual(queryset.update.call_count, 2, "the UPDATE should be made again")
@@ -0,0 +1,124 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..models import Identifier, ItemTemplate, LinkedCode
+from ..scans import KnownCodes, Scan, ScanCache, known_codes, lookup, lookup_many, resolve
+from ..scans import resolve_many, scan_cache
+
+
+class ScanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Identifier.idents.create(barcode='1007')
+        bolt = Identifier.idents.create(barcode='1000002')
+        LinkedCode.link(bolt, '0006151620418')
+        ItemTemplate.objects.create(description='Bolt of Fabric', brand='Moda', identifier=bolt)
+        # a linked code that is also another identifier's barcode
+        LinkedCode.link(Identifier.idents.create(barcode='1000015'), '1007')
+
+    def setUp(self):
+        scan_cache.clear()
+
+    def test_lookup(self):
+        with self.assertNumQueries(1):
+            scan = lookup('0006151620418')
+        self.assertEqual(scan.barcode, '1000002')
+        self.assertEqual(scan.kind, 'ITM')
+        self.assertEqual(scan.item['description'], 'Bolt of Fabric')
+        self.assertEqual(scan.item['brand'], 'Moda')
+
+        self.assertEqual(lookup('1007'), Scan('1007', None, 'LOC', None),
+                         "a barcode match should win over a linked code")
+        self.assertIsNone(lookup('1000015').item, "no item for this identifier")
+        self.assertIsNone(lookup('999'))
+
+    def test_lookup_many(self):
+        codes = ['0006151620418', '1007', '999', '1000015']
+        with self.assertNumQueries(2):
+            found = lookup_many(codes, chunk_size=2)
+        self.assertEqual(list(found), codes)
+        self.assertEqual(found['0006151620418'].barcode, '1000002')
+        self.assertEqual(found['1007'].barcode, '1007', "a barcode match should win")
+        self.assertIsNone(found['999'])
+        self.assertEqual(found, {ds: lookup(ds) for ds in codes})
+
+        resolve('1007')
+        with self.assertNumQueries(1):
+            found = resolve_many(['1007', '999', '1000002'])
+        self.assertEqual(found['1000002'].linked_code, '0006151620418')
+        with self.assertNumQueries(0):
+            resolve_many(['999', '1000002'])
+
+    def test_cache(self):
+        self.assertEqual(resolve('1000002').barcode, '1000002')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve('1000002').barcode, '1000002')
+        self.assertIsNone(resolve('1000028'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve('1000028'), "unknown codes should be cached too")
+
+        ItemTemplate.objects.create(description='Fabric Panel',
+                                    identifier=Identifier.idents.create(barcode='1000028'))
+        self.assertEqual(resolve('1000028').item['description'], 'Fabric Panel',
+                         "saves should clear the cache")
+
+    def test_bounds(self):
+        cache = ScanCache(size=2)
+        load = mock.Mock(side_effect=lambda ds: ds)
+        for ds in ['1', '2', '1', '3', '1', '2']:
+            cache.get(ds, load)
+        self.assertEqual([c.args[0] for c in load.call_args_list], ['1', '2', '3', '2'],
+                         "least recently used entry should be dropped")
+
+        cache = ScanCache(max_age=-1)
+        cache.get('1', load)
+        cache.get('1', load)
+        self.assertEqual(load.call_count, 6, "expired entries should be reloaded")
+
+
+class KnownCodesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        LinkedCode.link(Identifier.idents.create(barcode='1007'), '0006151620418')
+
+    def setUp(self):
+        scan_cache.clear()
+
+    def test_filter(self):
+        known = KnownCodes()
+        with self.assertNumQueries(2):
+            known.current()
+        self.assertIn('1007', known)
+        self.assertIn('0006151620418', known)
+        self.assertFalse(known.may_exist('0006151620419'))
+        self.assertTrue(known.may_exist('1000002'), "good check digit; may be new elsewhere")
+
+        misses = ['{:013d}'.format(n) for n in range(2000)]
+        errors = sum(code in known for code in misses)
+        self.assertLess(errors, 100, "about 1% should get through")
+
+    def test_refresh(self):
+        known = KnownCodes(refresh=-1)
+        known.current()
+        # as if linked by another process: no signals here
+        LinkedCode.objects.bulk_create([LinkedCode(code='0006151620425', identifier_id='1007')])
+        self.assertTrue(known.may_exist('0006151620425'))
+
+        for n in range(known.capacity + 1):
+            known.add('{}'.format(n))
+        with self.assertNumQueries(2):
+            known.current()
+        self.assertEqual(known.count, 3, "an overfull filter should be rebuilt")
+
+    def test_unknown_scans(self):
+        known_codes.reset()
+        resolve('1007')
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve('0006151620419'))
+            self.assertEqual(resolve_many(['123', '456']), {'123': None, '456': None})
+
+        Identifier.idents.create(barcode='1235')    # not a Damm code
+        self.assertEqual(resolve('1235').barcode, '1235', "saves should add to the filter")
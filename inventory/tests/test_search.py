@@ -0,0 +1,88 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Identifier, ItemTemplate, ItemTerm
+from ..search import tokenize, item_terms, rank
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batik = ItemTemplate.objects.create(
+                    description='Blue Batik Bolt', brand='Moda', content='cotton',
+                    identifier=Identifier.idents.create(barcode='1000002'))
+        cls.panel = ItemTemplate.objects.create(
+                    description='Fabric Panel', brand='Moda',
+                    notes='blue border print',
+                    identifier=Identifier.idents.create(barcode='1000015'))
+        cls.notion = ItemTemplate.objects.create(
+                    description='Bias Tape Maker', brand='Clover', content='notion',
+                    yardage=False,
+                    identifier=Identifier.idents.create(barcode='1000028'))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Moda  Blue-Batik, 44"'), ['moda', 'blue', 'batik', '44'])
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(item_terms(self.panel)['blue'], 1, "found only in notes")
+        self.assertEqual(item_terms(self.batik)['blue'], 4, "found in the description")
+
+    def test_index_follows_saves(self):
+        terms = set(self.notion.terms.values_list('term', flat=True))
+        self.assertEqual(terms, {'bias', 'tape', 'maker', 'clover', 'notion'})
+
+        self.notion.brand = 'Dritz'
+        self.notion.save()
+        terms = set(self.notion.terms.values_list('term', flat=True))
+        self.assertIn('dritz', terms)
+        self.assertNotIn('clover', terms)
+
+        self.notion.delete()
+        self.assertFalse(ItemTerm.objects.filter(item_id='1000028').exists())
+
+    def test_rank(self):
+        ranked = rank('moda blue', 10)
+        self.assertEqual([pk for pk, score in ranked], ['1000002', '1000015'],
+                         "a description match should rank first")
+        self.assertEqual(rank('moda blue batik', 10)[0][0], '1000002')
+        self.assertEqual([pk for pk, score in rank('bat', 10)], ['1000002'],
+                         "words should match term prefixes")
+        self.assertEqual(rank('bi', 10), [], "short words match whole terms only")
+        self.assertEqual(rank('moda notion', 10), [], "every word must match")
+        self.assertEqual(len(rank('moda', 1)), 1)
+        self.assertEqual(rank('  ', 10), [])
+
+    def test_rebuild(self):
+        ItemTemplate.objects.filter(pk=self.panel.pk).update(description='Border Panel')
+        self.assertEqual(rank('border panel', 10)[0][0], '1000015')
+        self.assertEqual(rank('border', 10)[0][1], 2, "notes weight, doubled")
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 items', out.getvalue())
+        self.assertEqual(rank('border', 10)[0][1], 8, "description weight, doubled")
+
+    def test_endpoint(self):
+        url = reverse('item-search')
+        response = self.client.get('{}?q=Moda+blue'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 2)
+        self.assertEqual([each['barcode'] for each in d['objects']], ['1000002', '1000015'])
+        self.assertEqual(d['objects'][0]['description'], 'Blue Batik Bolt')
+        self.assertGreater(d['objects'][0]['score'], d['objects'][1]['score'])
+
+        response = self.client.get('{}?q=moda&limit=1&fields=barcode'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['objects'], [{'barcode': '1000002', 'score': 6}])
+
+        response = self.client.get(url)
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 0, "no query, no results")
+
+        response = self.client.get('{}?q=moda&limit=none'.format(url))
+        self.assertEqual(response.status_code, 400, "should reject a bad limit")
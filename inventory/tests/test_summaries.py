@@ -0,0 +1,71 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Identifier, Invoice, ItemTemplate, Purchase, Supplier
+from ..receiving import add_cost, receive
+from ..summaries import refresh
+
+
+class SummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = Supplier.objects.create(name='My supplier')
+        cls.invoice = Invoice.objects.create(vendor=vendor)
+        cls.other = Invoice.objects.create(vendor=vendor)
+        barcodes = Identifier.make_item_ids(3)
+        ItemTemplate.objects.bulk_create([ItemTemplate(identifier_id=bc,
+                                                       description='Fabric {}'.format(bc))
+                                          for bc in barcodes])
+        cls.barcodes = barcodes
+
+    def totals(self, invoice):
+        invoice.refresh_from_db()
+        return invoice.lines, invoice.total_cost, invoice.total_units
+
+    def test_purchase_signals(self):
+        first, second = self.barcodes[:2]
+        pchs = Purchase.objects.create(invoice=self.invoice, item_id=first,
+                                       cost=Decimal('2.50'), units=Decimal(2))
+        Purchase.objects.create(invoice=self.invoice, item_id=second, cost=Decimal('1.25'))
+        self.assertEqual(self.totals(self.invoice), (2, Decimal('3.75'), Decimal(2)))
+
+        pchs = Purchase.objects.get(id=pchs.id)
+        pchs.cost = Decimal('3.00')
+        pchs.save()
+        self.assertEqual(self.totals(self.invoice), (2, Decimal('4.25'), Decimal(2)))
+
+        pchs.invoice = self.other
+        pchs.save()
+        self.assertEqual(self.totals(self.invoice), (1, Decimal('1.25'), Decimal(0)))
+        self.assertEqual(self.totals(self.other), (1, Decimal('3.00'), Decimal(2)))
+
+        pchs.delete()
+        self.assertEqual(self.totals(self.other), (0, Decimal(0), Decimal(0)))
+
+    def test_bulk_writers(self):
+        item = ItemTemplate.objects.get(identifier_id=self.barcodes[0])
+        add_cost(self.invoice, item, Decimal('2.99'))
+        add_cost(self.invoice, item, Decimal('1.01'), Decimal(2))
+        self.assertEqual(self.totals(self.invoice), (1, Decimal('4.00'), Decimal(2)))
+
+        receive(self.invoice.id, [{'item': bc, 'cost': '1.00', 'units': 1}
+                                  for bc in self.barcodes])
+        self.assertEqual(self.totals(self.invoice), (3, Decimal('7.00'), Decimal(5)))
+
+    def test_refresh(self):
+        Purchase.objects.create(invoice=self.invoice, item_id=self.barcodes[0],
+                                cost=Decimal('2.50'), units=Decimal('1.5'))
+        Invoice.objects.update(lines=9, total_cost=99, total_units=99)
+        self.assertEqual(refresh(), 2)
+        self.assertEqual(self.totals(self.invoice), (1, Decimal('2.50'), Decimal('1.5')))
+        self.assertEqual(self.totals(self.other), (0, Decimal(0), Decimal(0)))
+
+        Invoice.objects.update(lines=9)
+        out = StringIO()
+        call_command('refresh_invoice_summaries', stdout=out)
+        self.assertIn("2 invoices refreshed", out.getvalue())
+        self.assertEqual(self.totals(self.other)[0], 0)
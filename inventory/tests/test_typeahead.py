@@ -0,0 +1,71 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Identifier, ItemTemplate
+from ..typeahead import Typeahead, typeahead
+
+
+class TypeaheadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for barcode, desc, brand in [('1000002', 'Blue Batik Bolt', 'Moda'),
+                                     ('1000015', 'Bias Tape Maker', 'Clover'),
+                                     ('1000028', 'Modern Panel', 'Moda')]:
+            ItemTemplate.objects.create(description=desc, brand=brand,
+                                        identifier=Identifier.idents.create(barcode=barcode))
+
+    def test_suggest(self):
+        ta = Typeahead()
+        self.assertIsNone(ta.built, "should load on first use")
+        self.assertEqual(ta.suggest('mod'), [('brand', 'Moda', None),
+                                             ('description', 'Modern Panel', '1000028')])
+        self.assertEqual(ta.suggest('B', limit=2), [('description', 'Bias Tape Maker', '1000015'),
+                                                    ('description', 'Blue Batik Bolt', '1000002')])
+        self.assertEqual(ta.suggest('zz'), [])
+        self.assertEqual(ta.suggest(''), [])
+
+    def test_changes(self):
+        ta = Typeahead()
+        ta.rebuild()
+        ta.update('1000040', 'Moda Charm Pack', 'Moda')
+        self.assertEqual([text for field, text, pk in ta.suggest('moda ')], ['Moda Charm Pack'])
+
+        ta.update('1000028', 'Fat Quarter', 'Riley Blake')
+        self.assertEqual([text for field, text, pk in ta.suggest('mod')],
+                         ['Moda', 'Moda Charm Pack'])
+        self.assertEqual(ta.suggest('ril'), [('brand', 'Riley Blake', None)])
+
+        ta.remove('1000002')
+        ta.remove('1000040')
+        self.assertEqual(ta.suggest('mod'), [], "no Moda items are left")
+        self.assertEqual(ta.brand_counts['Clover'], 1)
+
+        with mock.patch.object(ta, 'max_age', -1):
+            self.assertEqual(ta.suggest('mod')[0], ('brand', 'Moda', None),
+                             "should reload when stale")
+
+    def test_signals(self):
+        typeahead.rebuild()
+        item = ItemTemplate.objects.create(description='Rotary Cutter', brand='Olfa',
+                                           identifier=Identifier.idents.create(barcode='1000031'))
+        self.assertEqual(typeahead.suggest('rot'), [('description', 'Rotary Cutter', '1000031')])
+        item.delete()
+        self.assertEqual(typeahead.suggest('rot'), [])
+
+    def test_endpoint(self):
+        typeahead.rebuild()
+        url = reverse('item-suggest')
+        response = self.client.get('{}?q=mo'.format(url))
+        self.assertEqual(response.status_code, 200, "should return a list")
+        d = json.loads(response.content)
+        self.assertEqual(d['objects'], [
+            {'field': 'brand', 'value': 'Moda'},
+            {'field': 'description', 'value': 'Modern Panel', 'barcode': '1000028'},
+        ])
+        response = self.client.get('{}?q=b&limit=1'.format(url))
+        d = json.loads(response.content)
+        self.assertEqual(d['count'], 1)
@@ -1,6 +1,6 @@
 from django.test import TestCase
 
-from ..utils import check_digit
+from ..utils import check_digit, check_digits, valid_codes
 
 
 class CheckDigitTest(TestCase):
@@ -13,4 +13,15 @@ class CheckDigitTest(TestCase):
         self.assertEqual(result, 4, "Algorithm should return '4'")
         result = check_digit('4028736')
         self.assertEqual(result, 0, "Algorithm should return '0'")
+        result = check_digit('٥٧٢')
+        self.assertEqual(result, 4, "other scripts' decimal digits are digits too")
         return
+
+    def test_check_digits(self):
+        values = ['572', '4-A', '', '402873', '100', '100000', '57٢', '57²']
+        result = check_digits(values)
+        self.assertEqual(result, [4, -1, -1, 6, 7, 2, 4, -1])
+        self.assertEqual(result, [check_digit(val) for val in values],
+                         "batch should agree with check_digit")
+        self.assertEqual(valid_codes(['5724', '5725', '4028736', 'x']),
+                         [True, False, True, False])
@@ -0,0 +1,115 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ItemTemplate
+
+
+class Typeahead(object):
+    """
+    In-process prefix index over item descriptions and brands.
+
+    Both are kept as sorted lists of lower-cased keys, so the suggestions
+    for a prefix are a ``bisect`` plus a short forward walk, without a
+    query.  Saves and deletes in this process patch the lists in place;
+    changes made by other processes show up when the lists are rebuilt,
+    at most ``max_age`` seconds later.
+    """
+    max_age = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = None
+        self.items = {}             # pk: (description, brand)
+        self.descriptions = []      # (key, description, pk)
+        self.brands = []            # (key, brand)
+        self.brand_counts = Counter()
+
+    def rebuild(self):
+        rows = ItemTemplate.objects.values_list('pk', 'description', 'brand')
+        items = {pk: (desc, brand) for pk, desc, brand in rows}
+        brand_counts = Counter(brand for desc, brand in items.values() if brand)
+        with self.lock:
+            self.items = items
+            self.descriptions = sorted((desc.lower(), desc, pk)
+                                       for pk, (desc, brand) in items.items())
+            self.brands = sorted((brand.lower(), brand) for brand in brand_counts)
+            self.brand_counts = brand_counts
+            self.built = time.monotonic()
+
+    def is_stale(self):
+        return self.built is None or time.monotonic() - self.built > self.max_age
+
+    def update(self, pk, description, brand):
+        with self.lock:
+            if self.built is None:  # nothing loaded yet
+                return
+            self._discard(pk)
+            self.items[pk] = (description, brand)
+            insort(self.descriptions, (description.lower(), description, pk))
+            if brand:
+                if not self.brand_counts[brand]:
+                    insort(self.brands, (brand.lower(), brand))
+                self.brand_counts[brand] += 1
+
+    def remove(self, pk):
+        with self.lock:
+            if self.built is not None:
+                self._discard(pk)
+
+    def _discard(self, pk):
+        if pk not in self.items:
+            return
+        desc, brand = self.items.pop(pk)
+        entry = (desc.lower(), desc, pk)
+        ix = bisect_left(self.descriptions, entry)
+        if ix < len(self.descriptions) and self.descriptions[ix] == entry:
+            del self.descriptions[ix]
+        if brand:
+            self.brand_counts[brand] -= 1
+            if not self.brand_counts[brand]:
+                del self.brand_counts[brand]
+                self.brands.remove((brand.lower(), brand))
+
+    def suggest(self, prefix, limit=10):
+        """
+        :returns: Up to ``limit`` brands, then descriptions, that start with
+            ``prefix`` (ignoring case), each as ``(field, text, pk)``
+        """
+        key = prefix.lower()
+        if not key:
+            return []
+        if self.is_stale():
+            self.rebuild()
+        found = []
+        with self.lock:
+            for brand_key, brand in self._walk(self.brands, key, limit):
+                found.append(('brand', brand, None))
+            for desc_key, desc, pk in self._walk(self.descriptions, key, limit - len(found)):
+                found.append(('description', desc, pk))
+        return found
+
+    @staticmethod
+    def _walk(entries, key, limit):
+        ix = bisect_left(entries, (key,))
+        end = min(len(entries), ix + limit)
+        while ix < end and entries[ix][0].startswith(key):
+            yield entries[ix]
+            ix += 1
+
+
+typeahead = Typeahead()
+
+
+@receiver(post_save, sender=ItemTemplate, dispatch_uid='inventory.typeahead.update')
+def item_saved(sender, instance, **kwargs):
+    typeahead.update(instance.pk, instance.description, instance.brand)
+
+
+@receiver(post_delete, sender=ItemTemplate, dispatch_uid='inventory.typeahead.remove')
+def item_deleted(sender, instance, **kwargs):
+    typeahead.remove(instance.pk)
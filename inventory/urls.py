@@ -16,22 +16,33 @@ urlpatterns = [
     path('images/upload', views.images_upload, name='images-upload'),
 
     path('stock', views.stockbook, name='stockBook'),
+    path('labels', views.labels, name='labels'),
+    path('purchase/import', views.packing_list_upload, name='packing-list-upload'),
     path('purchase', login_required(TemplateView.as_view(
                                     template_name="inventory/purchasing.html")), name='purchasing'),
 
     path('dev', TemplateView.as_view(template_name="inventory/dev.html"), name="dev-api"),
     path('api/locid', apis.LocIdResource.as_list(), name='locid-list'),
     path('api/locid/<int:pk>', apis.LocIdResource.as_detail(), name='locid-detail'),
+    path('api/itemid', apis.ItemIdResource.as_list(), name='itemid-list'),
+    path('api/itemid/<int:pk>', apis.ItemIdResource.as_detail(), name='itemid-detail'),
+    path('api/idents', apis.IdentResource.as_list(), name='ident-list'),
     path('api/idents/<str:digitstring>', apis.IdentResource.as_detail(), name='ident-detail'),
     path('api/location', apis.LocationResource.as_list(), name='location-list'),
     path('api/location/<int:pk>', apis.LocationResource.as_detail(), name='location-detail'),
+    path('api/printjob', apis.PrintJobResource.as_list(), name='printjob-list'),
+    path('api/printjob/<int:pk>', apis.PrintJobResource.as_detail(), name='printjob-detail'),
     path('api/supplier', apis.SupplierResource.as_list(), name='supplier-list'),
     path('api/supplier/<int:pk>', apis.SupplierResource.as_detail(), name='supplier-detail'),
     path('api/item', apis.ItemTemplateResource.as_list(), name='item-list'),
+    path('api/item/search', apis.ItemSearchResource.as_list(), name='item-search'),
+    path('api/item/suggest', apis.ItemSuggestResource.as_list(), name='item-suggest'),
     path('api/item/<int:pk>', apis.ItemTemplateResource.as_detail(), name='item-detail'),
     path('api/itemdata/<str:digitstring>', apis.ItemDataResource.as_detail(),
          name='itemdata-detail'),
     path('api/itemdata', apis.ItemDataResource.as_list(), name='itemdata-list'),
+    path('api/itemdetails/<int:pk>', apis.ItemDetailsResource.as_detail(),
+         name='itemdetails-detail'),
     path('api/picture', apis.PictureResource.as_list(), name='picture-list'),
     path('api/picture/<int:pk>', apis.PictureResource.as_detail(), name='picture-detail'),
     path('api/stock', apis.StockBookResource.as_list(), name='stock-list'),
@@ -40,6 +51,7 @@ urlpatterns = [
     path('api/price/<int:pk>', apis.PriceResource.as_detail(), name='price-detail'),
     path('api/invoice', apis.InvoiceResource.as_list(), name='invoice-list'),
     path('api/invoice/<int:pk>', apis.InvoiceResource.as_detail(), name='invoice-detail'),
+    path('api/receiving', apis.ReceivingResource.as_list(), name='receiving-list'),
     path('api/purchase', apis.PurchaseResource.as_list(), name='purchase-list'),
     path('api/purchase/<int:pk>', apis.PurchaseResource.as_detail(), name='purchase-detail'),
     path('api/receipt', apis.ReceiptResource.as_list(), name='receipt-list'),
@@ -11,15 +11,46 @@ DAMM_OP_TABLE = [
         [2, 3, 9, 6, 8, 1, 4, 7, 5, 0],   # col 9
     ]
 
+# The same table, flattened for byte input: DAMM_STEPS[interim][byte] is the
+# next interim digit for the ASCII bytes of '0'..'9'.  Any other byte leads
+# to DAMM_SINK, which never leaves, so bad input needs no separate check.
+DAMM_SINK = 10
+DAMM_STEPS = [bytes(DAMM_OP_TABLE[b - 48][rx] if 48 <= b <= 57 else DAMM_SINK
+                    for b in range(256)) for rx in range(10)]
+DAMM_STEPS.append(bytes([DAMM_SINK] * 256))
+
+
+def ascii_digits(digitstring):
+    """
+    Spells other scripts' decimal digits ('٥', '５') in ASCII, as the table
+    needs; ``str.isdecimal()`` accepts them as digits.
+    """
+    if digitstring.isascii() or not digitstring.isdecimal():
+        return digitstring
+    return ''.join('{}'.format(int(ch)) for ch in digitstring)
+
 
 def check_digit(digitstring):
     """An implementation of the Damm algorithm."""
-    if not digitstring.isdecimal():
+    if not digitstring:
         return -1
+    steps = DAMM_STEPS
     interim = 0
+    for byte in ascii_digits(digitstring).encode('ascii', 'replace'):
+        interim = steps[interim][byte]
+    return -1 if interim == DAMM_SINK else interim
+
+
+def check_digits(digitstrings):
+    """
+    The Damm check digit of each string in a batch (-1 for any that is not
+    a string of digits).
+    """
+    return list(map(check_digit, digitstrings))
+
 
-    for digit in digitstring:
-        cx = int(digit)
-        rx = interim
-        interim = DAMM_OP_TABLE[cx][rx]
-    return interim
+def valid_codes(codes):
+    """
+    :returns: For each code (check digit included), whether it is valid
+    """
+    return [digit == 0 for digit in check_digits(codes)]
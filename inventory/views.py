@@ -1,3 +1,4 @@
+import codecs
 import json
 
 from django.contrib.auth.decorators import login_required
@@ -5,10 +6,14 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.conf import settings
 from django.core.paginator import Paginator
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.template.response import TemplateResponse
 
-from .models import Identifier, Location, Supplier, ItemTemplate, Picture
+from . import labels as label_sheets
+from .models import Identifier, Location, Supplier, ItemTemplate, Picture, Invoice
+from .packing import import_packing_list
+
+MAX_LABELS = 3000
 
 
 @login_required
@@ -118,3 +123,57 @@ def identifier_detail(request, pk):
         fields[name] = val
     resp = JsonResponse(fields, encoder=DjangoJSONEncoder)
     return resp
+
+
+# GET /inventory/labels?barcodes=1010,1000015&format=pdf&template=&sheet=
+@login_required
+def labels(request):
+    barcodes = [bc for bc in request.GET.get('barcodes', '').split(',') if bc]
+    if not barcodes:
+        return HttpResponseBadRequest("No barcodes given")
+    if len(barcodes) > MAX_LABELS:
+        return HttpResponseBadRequest("At most {} labels at once".format(MAX_LABELS))
+    if not all(bc.isdigit() for bc in barcodes):
+        return HttpResponseBadRequest("Barcodes are digit strings")
+
+    try:
+        content, content_type = label_sheets.render(
+            barcodes, request.GET.get('format', 'pdf'),
+            template=request.GET.get('template') or None,
+            sheet=request.GET.get('sheet') or None)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return HttpResponse(content, content_type=content_type)
+
+
+# POST /inventory/purchase/import    a packing list file, with 'vendor' or 'invoice'
+def packing_list_upload(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a packing list'}, status=405)
+    if not request.user.has_perm('inventory.add_purchase'):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+
+    upload = None
+    for fil in request.FILES:
+        upload = request.FILES[fil]
+    if upload is None:
+        return JsonResponse({'error': 'No file uploaded'})
+
+    inv_id = request.POST.get('invoice')
+    vendor_id = request.POST.get('vendor')
+    if inv_id:
+        invoice = Invoice.objects.filter(id=inv_id).first() if inv_id.isdigit() else None
+        if invoice is None:
+            return JsonResponse({'error': 'Invoice #{} not found'.format(inv_id)})
+    else:
+        vendor = None
+        if vendor_id and vendor_id.isdigit():
+            vendor = Supplier.objects.filter(id=vendor_id).first()
+        if vendor is None:
+            return JsonResponse({'error': 'A supplier is required'})
+        invoice = Invoice(vendor=vendor)
+
+    # the upload is read a line at a time, never whole
+    lines = codecs.iterdecode(upload, 'utf-8-sig', errors='replace')
+    report = import_packing_list(lines, invoice)
+    return JsonResponse(report, encoder=DjangoJSONEncoder)
@@ -140,6 +140,12 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Label printing (see inventory/printing.py): the spooler writes to a
+# printer device file (e.g. /dev/usb/lp0), or one file a batch into a
+# spool directory
+LABEL_PRINTER = os.path.join(BASE_DIR, 'spool')
+LABEL_FORMAT = 'zpl'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 